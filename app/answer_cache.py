@@ -0,0 +1,164 @@
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from vector_store import log_id
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_logs(logs):
+    """Return a digest of the ordered log IDs of a retrieved set."""
+    digest = hashlib.sha1()
+    for log in logs:
+        digest.update(log_id(log).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class CacheEntry:
+    def __init__(self, embedding, key, fingerprint, result, data_version):
+        self.embedding = embedding
+        self.key = key
+        self.fingerprint = fingerprint
+        self.result = result
+        self.data_version = data_version
+        self.created = time.time()
+
+
+class CacheProbe:
+    """Outcome of looking up a query: its embedding and the closest entry, if any."""
+
+    def __init__(self, embedding, key, entry=None, similarity=0.0):
+        self.embedding = embedding
+        self.key = key
+        self.entry = entry
+        self.similarity = similarity
+
+
+class AnswerCache:
+    """Semantic cache of query results keyed on the query embedding.
+
+    A cached answer is reused for a new query whose embedding has cosine
+    similarity of at least ANSWER_CACHE_THRESHOLD with the cached query and
+    whose key (query type and exact value, e.g. the transid) matches.
+
+    Every ingest that adds logs bumps the data version. An entry from an older
+    version is only reused after retrieval has been re-run and returned the
+    same log IDs (the fingerprint), which skips the LLM call; otherwise it is
+    replaced. Entries expire after ANSWER_CACHE_TTL seconds and the cache
+    holds at most ANSWER_CACHE_MAX_ENTRIES, evicting least recently used.
+    """
+
+    def __init__(self, embed_fn):
+        # embed_fn may return None when no embedding model is available yet
+        self.embed_fn = embed_fn
+        self.enabled = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+        self.max_entries = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+        self.ttl = float(os.getenv("ANSWER_CACHE_TTL", "900"))
+        self.threshold = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+        self.data_version = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def bump_version(self):
+        """Mark cached answers stale after new logs were ingested."""
+        with self._lock:
+            self.data_version += 1
+
+    def probe(self, query, key):
+        """Find the most similar unexpired entry with the same key."""
+        if not self.enabled:
+            return CacheProbe(None, key)
+
+        try:
+            embedding = self.embed_fn(query)
+        except Exception as e:
+            logger.error(f"Error embedding query for answer cache: {e}")
+            return CacheProbe(None, key)
+        if embedding is None:
+            return CacheProbe(None, key)
+        embedding = _normalize(embedding)
+
+        now = time.time()
+        best_id, best_similarity = None, -1.0
+        with self._lock:
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry.created > self.ttl:
+                    del self._entries[entry_id]
+                    continue
+                if entry.key != key:
+                    continue
+                similarity = sum(a * b for a, b in zip(embedding, entry.embedding))
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.threshold:
+                return CacheProbe(embedding, key)
+            self._entries.move_to_end(best_id)
+            return CacheProbe(embedding, key, self._entries[best_id], best_similarity)
+
+    def fresh(self, probe):
+        """Return the probed entry if no new logs were ingested since it was stored."""
+        if probe.entry is not None and probe.entry.data_version == self.data_version:
+            with self._lock:
+                self.hits += 1
+            logger.info(f"Answer cache hit (similarity {probe.similarity:.3f})")
+            return probe.entry
+        return None
+
+    def revalidate(self, probe, logs):
+        """Return the probed entry if re-run retrieval produced the same logs."""
+        if probe.entry is not None and probe.entry.fingerprint == fingerprint_logs(logs):
+            with self._lock:
+                probe.entry.data_version = self.data_version
+                self.revalidated += 1
+            logger.info(f"Answer cache revalidated (similarity {probe.similarity:.3f})")
+            return probe.entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, probe, logs, result):
+        """Cache a result for the probed query."""
+        if not self.enabled or probe.embedding is None:
+            return
+        entry = CacheEntry(probe.embedding, probe.key, fingerprint_logs(logs), result, self.data_version)
+        with self._lock:
+            if probe.entry is not None:
+                # Replace the stale entry this query matched
+                for entry_id, existing in self._entries.items():
+                    if existing is probe.entry:
+                        del self._entries[entry_id]
+                        break
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "data_version": self.data_version
+            }
@@ -0,0 +1,233 @@
+"""Backfill the vector store with historical logs.
+
+Splits a time range into shards, reads shards concurrently from
+Elasticsearch and embeds on a process pool using every CPU core:
+
+    python backfill.py --hours 168
+    python backfill.py --start 2024-05-01T00:00:00Z --end 2024-05-08T00:00:00Z --shard-hours 3
+
+Finished shards are recorded in a progress file, so an interrupted run
+resumes with the shards that are left. Logs already in the vector store
+are skipped, so re-running a half-finished shard is safe.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+
+# Embedding engine of a pool process
+_engine = None
+
+
+def _init_embedding_process():
+    """Load one single-threaded embedding model per pool process."""
+    global _engine
+    os.environ["EMBEDDING_THREADS"] = "1"
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    from embeddings import EmbeddingEngine
+    _engine = EmbeddingEngine()
+
+
+def _encode(texts):
+    return _engine.encode(texts)
+
+
+def parse_time(value):
+    """Parse an ISO-8601 time (naive means UTC)."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def floor_time(value, shard_hours):
+    """Round value down to a multiple of shard_hours since the epoch."""
+    step = shard_hours * 3600
+    return datetime.fromtimestamp(value.timestamp() // step * step, timezone.utc)
+
+
+def make_shards(start, end, shard_hours):
+    """Split [start, end) into (start, end) shards of shard_hours."""
+    shards = []
+    step = timedelta(hours=shard_hours)
+    current = start
+    while current < end:
+        shards.append((current, min(current + step, end)))
+        current += step
+    return shards
+
+
+class BackfillProgress:
+    """Per-shard completion state, saved atomically as JSON after every shard."""
+
+    def __init__(self, path):
+        self.path = path
+        self.shards = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.shards = json.load(f).get("shards", {})
+            logger.info(f"Loaded backfill progress: {len(self.shards)} shards done")
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def key(shard):
+        return f"{shard[0].isoformat()}/{shard[1].isoformat()}"
+
+    def is_done(self, shard):
+        return self.key(shard) in self.shards
+
+    def mark_done(self, shard, docs, seconds):
+        with self._lock:
+            self.shards[self.key(shard)] = {"docs": docs, "seconds": round(seconds, 1)}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"shards": self.shards}, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+class Backfill:
+    """Read shards concurrently, embed on a process pool and write in large batches."""
+
+    def __init__(self, pipeline, progress, readers, processes, batch_size):
+        self.pipeline = pipeline
+        self.progress = progress
+        self.readers = readers
+        self.processes = processes
+        self.batch_size = batch_size
+        # Spawn rather than fork: the parent already runs ES client and model threads
+        self.pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_embedding_process
+        )
+        self.docs = 0
+        self.started = None
+        self._lock = threading.Lock()
+
+    def _ingest(self, logs):
+        """Write one batch of logs, embedding on the process pool. Returns the number written."""
+        pipeline = self.pipeline
+        pipeline.transaction_index.add_logs(logs)
+        if pipeline.template_miner:
+            return pipeline.vector_store.add_templates(pipeline.template_miner.add_logs(logs))
+
+        written = 0
+        for collection, ids, documents, metadatas in pipeline.vector_store.plan_writes(logs):
+            written += pipeline.vector_store.write_batch(collection, ids, documents, metadatas, self._embed(documents))
+        return written
+
+    def _embed(self, documents):
+        """Embed documents split across all pool processes, in order."""
+        chunk_size = max(1, -(-len(documents) // self.processes))
+        futures = [
+            self.pool.submit(_encode, documents[i:i + chunk_size])
+            for i in range(0, len(documents), chunk_size)
+        ]
+        return [vector for future in futures for vector in future.result()]
+
+    def _run_shard(self, shard):
+        start = time.perf_counter()
+        docs = 0
+        # A scan error fails the shard instead of ending it early, so it is not marked done
+        for logs in self.pipeline.es_connector.scan_logs_between(
+            shard[0].isoformat(), shard[1].isoformat(), batch_size=self.batch_size, raise_errors=True
+        ):
+            written = self._ingest(logs)
+            docs += written
+            with self._lock:
+                self.docs += written
+        elapsed = time.perf_counter() - start
+        self.progress.mark_done(shard, docs, elapsed)
+        return docs, elapsed
+
+    def run(self, shards):
+        pending = [shard for shard in shards if not self.progress.is_done(shard)]
+        logger.info(f"Backfilling {len(pending)} of {len(shards)} shards with {self.readers} readers")
+        self.started = time.perf_counter()
+        failed = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="backfill") as readers:
+                futures = {readers.submit(self._run_shard, shard): shard for shard in pending}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    shard = futures[future]
+                    try:
+                        docs, elapsed = future.result()
+                        logger.info(f"Shard {BackfillProgress.key(shard)}: {docs} docs in {elapsed:.1f}s")
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Shard {BackfillProgress.key(shard)} failed: {e}")
+                    total_elapsed = time.perf_counter() - self.started
+                    logger.info(
+                        f"Progress: {done}/{len(pending)} shards, {self.docs} docs, "
+                        f"{self.docs / max(total_elapsed, 1e-9):.1f} docs/sec"
+                    )
+        finally:
+            self.pool.shutdown()
+        return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the vector store with historical logs.")
+    parser.add_argument("--start", help="range start (ISO-8601); default: --hours before --end")
+    parser.add_argument("--end", help="range end (ISO-8601); default: now, rounded down to a shard boundary")
+    parser.add_argument("--hours", type=float, default=168, help="range length when --start is omitted")
+    parser.add_argument("--shard-hours", type=float, default=6, help="hours per shard")
+    parser.add_argument("--readers", type=int, default=4, help="shards read concurrently")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="embedding processes")
+    parser.add_argument("--batch-size", type=int, default=2000, help="logs per ES page and write batch")
+    parser.add_argument("--progress", default=os.path.join(DATA_DIR, "backfill_progress.json"),
+                        help="progress file for resuming")
+    parser.add_argument("--restart", action="store_true", help="ignore previous progress")
+    args = parser.parse_args()
+
+    # Ranges derived from now are aligned to shard boundaries, so a resumed
+    # run produces the same shard keys as the interrupted one
+    end = parse_time(args.end) if args.end else floor_time(datetime.now(timezone.utc), args.shard_hours)
+    start = parse_time(args.start) if args.start else floor_time(end - timedelta(hours=args.hours), args.shard_hours)
+    shards = make_shards(start, end, args.shard_hours)
+
+    if args.restart and os.path.exists(args.progress):
+        os.remove(args.progress)
+    progress = BackfillProgress(args.progress)
+
+    from rag_pipeline import RAGPipeline
+    pipeline = RAGPipeline(lazy=True)
+    pipeline.warm_up(include_llm=False)
+    if pipeline.es_connector is None or pipeline.vector_store is None:
+        logger.error("Elasticsearch or the vector store is not available, aborting backfill")
+        raise SystemExit(1)
+
+    backfill = Backfill(pipeline, progress, args.readers, args.processes, args.batch_size)
+    failed = backfill.run(shards)
+    if backfill.docs:
+        # Bump the checkpoint's mtime so query processes drop stale cached answers;
+        # rewriting it could roll back a checkpoint the ingest worker advanced meanwhile
+        try:
+            os.utime(pipeline.checkpoint.path)
+        except OSError:
+            pass
+    elapsed = time.perf_counter() - backfill.started
+    logger.info(f"Backfill wrote {backfill.docs} docs in {elapsed:.1f}s ({backfill.docs / max(elapsed, 1e-9):.1f} docs/sec)")
+    if failed:
+        logger.error(f"{failed} shards failed; re-run to retry them")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
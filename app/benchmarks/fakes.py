@@ -0,0 +1,386 @@
+"""In-process stand-ins for Elasticsearch, the embedding model and Ollama."""
+import re
+import json
+import time
+import zlib
+import bisect
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from elasticsearch_connector import ElasticsearchConnector
+from vector_store import timestamp_to_ms
+
+TEXT_FIELDS = ("message", "log", "details", "transid")
+KEYWORD_FIELDS = ("service", "level", "severity", "transid")
+# auto_date_histogram intervals, smallest first
+INTERVALS = [("1m", 60), ("5m", 300), ("10m", 600), ("30m", 1800), ("1h", 3600),
+             ("3h", 10800), ("12h", 43200), ("1d", 86400), ("7d", 604800)]
+
+
+def tokens(text):
+    return re.findall(r"\w+", str(text).lower())
+
+
+def ms_to_iso(value):
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def field_name(field):
+    return field[:-len(".keyword")] if field.endswith(".keyword") else field
+
+
+class FakeElasticsearch:
+    """Elasticsearch client stand-in over an in-memory, time-ordered index.
+
+    Supports the query shapes ElasticsearchConnector builds (match_all,
+    range on @timestamp, term, terms, match, multi_match and bool), sorting
+    by @timestamp or score, PIT + search_after paging and the terms, min,
+    max, top_hits and auto_date_histogram aggregations. Every search sleeps
+    latency_ms first to model the network and server time.
+    """
+
+    def __init__(self, docs, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.ids = []
+        self.sources = []
+        self.timestamps = []
+        self.postings = defaultdict(list)
+        self.keywords = {field: defaultdict(list) for field in KEYWORD_FIELDS}
+        self.searches = 0
+        self._pits = 0
+        self._lock = threading.Lock()
+
+        rows = sorted(((timestamp_to_ms(source.get("@timestamp")) or 0, doc_id, source) for doc_id, source in docs),
+                      key=lambda row: row[0])
+        for row, (timestamp, doc_id, source) in enumerate(rows):
+            self.ids.append(doc_id)
+            self.sources.append(source)
+            self.timestamps.append(timestamp)
+            for token in set(t for field in TEXT_FIELDS if source.get(field) for t in tokens(source[field])):
+                self.postings[token].append(row)
+            for field in KEYWORD_FIELDS:
+                if source.get(field) is not None:
+                    self.keywords[field][str(source[field]).lower()].append(row)
+        self.indices = self
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Client surface used by ElasticsearchConnector
+
+    def ping(self):
+        return True
+
+    def exists(self, index=None):
+        return True
+
+    def open_point_in_time(self, index=None, keep_alive=None):
+        with self._lock:
+            self._pits += 1
+            return {"id": f"pit-{self._pits}"}
+
+    def close_point_in_time(self, id=None):
+        return {"succeeded": True}
+
+    def search(self, index=None, body=None, size=10, request_timeout=None, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.searches += 1
+        body = body or {}
+        rows, scores = self._evaluate(body.get("query", {"match_all": {}}))
+        response = {"hits": {"total": {"value": len(rows), "relation": "eq"}, "hits": []}}
+        if "pit" in body:
+            response["pit_id"] = body["pit"]["id"]
+        if body.get("aggs"):
+            response["aggregations"] = self._aggregate(body["aggs"], self._ordered(rows, None, "asc"))
+        size = body.get("size", size)
+        if size:
+            response["hits"]["hits"] = self._page(rows, scores, body.get("sort", []), body.get("search_after"), size)
+        return response
+
+    # Query evaluation: each clause yields (rows, scores); rows is a range or a set
+
+    def _evaluate(self, query):
+        kind, spec = next(iter(query.items()))
+        if kind == "match_all":
+            return range(len(self.ids)), None
+        if kind == "range":
+            field, bounds = next(iter(spec.items()))
+            return self._range(bounds), None
+        if kind == "term":
+            field, value = next(iter(spec.items()))
+            return self._keyword(field_name(field), [value]), None
+        if kind == "terms":
+            field, values = next(iter(spec.items()))
+            return self._keyword(field_name(field), values), None
+        if kind == "match":
+            field, value = next(iter(spec.items()))
+            value = value["query"] if isinstance(value, dict) else value
+            if field_name(field) in KEYWORD_FIELDS and field_name(field) not in TEXT_FIELDS:
+                return self._keyword(field_name(field), [value]), None
+            return self._text(value)
+        if kind == "multi_match":
+            return self._text(spec["query"])
+        if kind == "bool":
+            return self._bool(spec)
+        raise ValueError(f"Unsupported query: {kind}")
+
+    def _range(self, bounds):
+        lo, hi = 0, len(self.timestamps)
+        if "gte" in bounds:
+            lo = bisect.bisect_left(self.timestamps, timestamp_to_ms(bounds["gte"]))
+        if "gt" in bounds:
+            lo = bisect.bisect_right(self.timestamps, timestamp_to_ms(bounds["gt"]))
+        if "lte" in bounds:
+            hi = bisect.bisect_right(self.timestamps, timestamp_to_ms(bounds["lte"]))
+        if "lt" in bounds:
+            hi = bisect.bisect_left(self.timestamps, timestamp_to_ms(bounds["lt"]))
+        return range(lo, max(lo, hi))
+
+    def _keyword(self, field, values):
+        index = self.keywords.get(field, {})
+        rows = set()
+        for value in values:
+            rows.update(index.get(str(value).lower(), ()))
+        return rows
+
+    def _text(self, text):
+        scores = Counter()
+        for token in set(tokens(text)):
+            for row in self.postings.get(token, ()):
+                scores[row] += 1
+        return set(scores), scores
+
+    @staticmethod
+    def _intersect(a, b):
+        if isinstance(a, range) and isinstance(b, range):
+            return range(max(a.start, b.start), max(max(a.start, b.start), min(a.stop, b.stop)))
+        if isinstance(a, range):
+            a, b = b, a
+        if isinstance(b, range):
+            return {row for row in a if b.start <= row < b.stop}
+        return a & b
+
+    def _bool(self, spec):
+        def clauses(key):
+            value = spec.get(key, [])
+            return value if isinstance(value, list) else [value]
+
+        rows, scores = None, Counter()
+        for clause in clauses("must") + clauses("filter"):
+            clause_rows, clause_scores = self._evaluate(clause)
+            rows = clause_rows if rows is None else self._intersect(rows, clause_rows)
+            if clause_scores:
+                scores.update(clause_scores)
+        should = clauses("should")
+        if should:
+            either = set()
+            for clause in should:
+                clause_rows, clause_scores = self._evaluate(clause)
+                either.update(clause_rows)
+                if clause_scores:
+                    scores.update(clause_scores)
+            # should is only required when there is nothing else to match
+            if rows is None:
+                rows = either
+        if rows is None:
+            rows = range(len(self.ids))
+        return rows, scores or None
+
+    # Sorting, paging and aggregations
+
+    def _ordered(self, rows, scores, order):
+        if isinstance(rows, range):
+            return rows if order == "asc" else rows[::-1]
+        if scores and order is None:
+            return sorted(rows, key=lambda row: (-scores.get(row, 0), row))
+        return sorted(rows, reverse=order == "desc")
+
+    def _page(self, rows, scores, sort, search_after, size):
+        order = None
+        for clause in sort:
+            if "@timestamp" in clause:
+                order = clause["@timestamp"].get("order", "asc") if isinstance(clause["@timestamp"], dict) else clause["@timestamp"]
+                break
+        if order is None and not scores:
+            order = "asc"
+        ordered = self._ordered(rows, scores, order)
+        if search_after is not None and order is not None:
+            last = search_after[-1]
+            if isinstance(rows, range):
+                if order == "asc":
+                    ordered = range(max(last + 1, rows.start), rows.stop)
+                else:
+                    ordered = range(min(last, rows.stop) - 1, rows.start - 1, -1)
+            else:
+                ordered = [row for row in ordered if (row > last if order == "asc" else row < last)]
+        return [
+            {
+                "_id": self.ids[row],
+                "_score": float(scores.get(row, 0)) if scores else 1.0,
+                "_source": dict(self.sources[row]),
+                "sort": [self.timestamps[row], row]
+            }
+            for row in list(ordered[:size])
+        ]
+
+    def _aggregate(self, aggs, rows):
+        rows = list(rows)
+        result = {}
+        for name, spec in aggs.items():
+            sub_aggs = spec.get("aggs", {})
+            if "terms" in spec:
+                field = field_name(spec["terms"]["field"])
+                groups = defaultdict(list)
+                for row in rows:
+                    value = self.sources[row].get(field)
+                    if value is not None:
+                        groups[value].append(row)
+                top = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)[:spec["terms"].get("size", 10)]
+                result[name] = {"buckets": [
+                    dict({"key": key, "doc_count": len(members)}, **self._aggregate(sub_aggs, members))
+                    for key, members in top
+                ]}
+            elif "min" in spec or "max" in spec:
+                values = [self.timestamps[row] for row in rows]
+                value = (min if "min" in spec else max)(values) if values else None
+                result[name] = {"value": value, "value_as_string": ms_to_iso(value) if value is not None else None}
+            elif "top_hits" in spec:
+                latest = sorted(rows, reverse=True)[:spec["top_hits"].get("size", 3)]
+                result[name] = {"hits": {"hits": [
+                    {"_id": self.ids[row], "_source": dict(self.sources[row])} for row in latest
+                ]}}
+            elif "auto_date_histogram" in spec:
+                result[name] = self._histogram(rows, spec["auto_date_histogram"].get("buckets", 10))
+        return result
+
+    def _histogram(self, rows, buckets):
+        if not rows:
+            return {"buckets": [], "interval": "1h"}
+        first, last = self.timestamps[min(rows)], self.timestamps[max(rows)]
+        label, seconds = INTERVALS[-1]
+        for label, seconds in INTERVALS:
+            if (last - first) / 1000 / seconds < buckets:
+                break
+        width = seconds * 1000
+        counts = Counter((self.timestamps[row] // width) * width for row in rows)
+        start = (first // width) * width
+        return {"interval": label, "buckets": [
+            {"key": key, "key_as_string": ms_to_iso(key), "doc_count": counts.get(key, 0)}
+            for key in range(start, last + 1, width)
+        ]}
+
+
+def fake_connector_class(client):
+    """Return an ElasticsearchConnector subclass that uses client instead of connecting."""
+
+    class FakeElasticsearchConnector(ElasticsearchConnector):
+        def _connect(self):
+            return client
+
+    return FakeElasticsearchConnector
+
+
+class HashEmbeddingEngine:
+    """Stand-in for EmbeddingEngine: normalized hashed bag-of-words vectors."""
+
+    def __init__(self, model_name=None, dimension=384):
+        self.model_name = "hash-bow"
+        self.dimension = dimension
+        self.available = True
+        self.cache = None
+        self.docs_encoded = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, texts):
+        start = time.perf_counter()
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in tokens(text):
+                vectors[i, zlib.crc32(token.encode("utf-8")) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-9)
+        self.docs_encoded += len(texts)
+        self.encode_seconds += time.perf_counter() - start
+        return vectors.tolist()
+
+    def throughput(self):
+        return self.docs_encoded / self.encode_seconds if self.encode_seconds else 0.0
+
+
+class FakeOllamaServer:
+    """Local HTTP server implementing Ollama's /api/generate.
+
+    Prompt evaluation takes prompt_ms_per_token per prompt token (chars/4)
+    and generation token_ms per output token; responses carry Ollama's
+    timing fields (nanoseconds) and stream as NDJSON when requested.
+    """
+
+    def __init__(self, prompt_ms_per_token=0.05, token_ms=5.0, tokens=40, port=0):
+        self.prompt_ms_per_token = prompt_ms_per_token
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson" if request.get("stream") else "application/json")
+                self.end_headers()
+                for chunk in server.generate(request):
+                    self.wfile.write((json.dumps(chunk) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def generate(self, request):
+        """Yield the response chunks for a generate request."""
+        prompt = request.get("prompt")
+        if not prompt:
+            # Model load request
+            yield {"model": request.get("model"), "done": True}
+            return
+        prompt_tokens = len(prompt) // 4
+        prompt_seconds = prompt_tokens * self.prompt_ms_per_token / 1000
+        time.sleep(prompt_seconds)
+        words = []
+        start = time.perf_counter()
+        for i in range(self.tokens):
+            time.sleep(self.token_ms / 1000)
+            word = f"token{i} "
+            words.append(word)
+            if request.get("stream"):
+                yield {"response": word, "done": False}
+        eval_seconds = time.perf_counter() - start
+        final = {
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": self.tokens,
+            "eval_duration": int(eval_seconds * 1e9),
+            "total_duration": int((prompt_seconds + eval_seconds) * 1e9),
+        }
+        if not request.get("stream"):
+            final["response"] = "".join(words)
+        yield final
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
@@ -0,0 +1,215 @@
+"""Offline end-to-end benchmark of the RAG pipeline.
+
+Run from the app directory:
+
+    python -m benchmarks.run --docs 100000 --output bench.json
+
+Elasticsearch and Ollama are replaced by in-process fakes with configurable
+latency, the vector store uses the local in-process backend and, unless
+--real-embeddings is given, embeddings come from a hashed bag-of-words
+stand-in. Reports startup time, ingest docs/sec, process_query latency
+percentiles per query type and the pipeline's peak RSS growth (measured
+from just before RAGPipeline is built, so the fakes' own memory is left
+out) as JSON, tagged with the git commit so results can be compared across
+commits.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline RAG pipeline benchmark.")
+    parser.add_argument("--docs", type=int, default=10000, help="synthetic logs to generate")
+    parser.add_argument("--span-hours", type=float, default=24, help="time span covered by the logs")
+    parser.add_argument("--queries", type=int, default=20, help="runs per query type")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--es-latency-ms", type=float, default=5.0, help="fake ES latency per search")
+    parser.add_argument("--llm-prompt-ms", type=float, default=0.05, help="fake Ollama ms per prompt token")
+    parser.add_argument("--llm-token-ms", type=float, default=5.0, help="fake Ollama ms per generated token")
+    parser.add_argument("--llm-tokens", type=int, default=40, help="tokens generated per answer")
+    parser.add_argument("--ingest", choices=["worker", "pipeline"], default="worker",
+                        help="staged ingest worker or RAGPipeline.refresh_logs")
+    parser.add_argument("--partition", default="day", help="VECTOR_PARTITION for the run")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache on")
+    parser.add_argument("--real-embeddings", action="store_true", help="use the configured SentenceTransformer")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    return parser.parse_args()
+
+
+def configure_environment(args, data_dir):
+    """Point every component at local stand-ins before any app module is imported."""
+    os.environ.update({
+        "DATA_DIR": data_dir,
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        "ES_HOST": "fake-es",
+        "ES_PORT": "9200",
+        "ES_INDEX": "logs-benchmark",
+        "VECTOR_BACKEND": "local",
+        "VECTOR_PARTITION": args.partition,
+        "VECTOR_RETENTION_HOURS": str(args.span_hours + 24),
+        "TRANSACTION_INDEX_RETENTION_HOURS": str(args.span_hours + 24),
+        "CHROMA_COLLECTION": "benchmark_logs",
+        "LLM_HOST": "127.0.0.1",
+        "LLM_MODEL": "fake",
+        "TEMPLATE_MINING": "false",
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "INGEST_IN_PROCESS": "true",
+        "HTTP_RETRIES": "0",
+    })
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def at(q):
+        return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))] * 1000
+
+    return {"count": len(samples), "p50_ms": at(50), "p95_ms": at(95), "p99_ms": at(99),
+            "mean_ms": sum(samples) / len(samples) * 1000}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=APP_DIR, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def current_rss_mb():
+    # Second field of statm is the resident set in pages
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+
+
+class RSSSampler:
+    """Track the peak resident set growth above a baseline in a background thread.
+
+    ru_maxrss is the peak of the whole process, including the in-process
+    fakes and generated logs, so the pipeline's share is sampled instead.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.baseline = current_rss_mb()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def stop(self):
+        """Stop sampling and return the peak growth in MB."""
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+        return self.peak - self.baseline
+
+
+def main():
+    args = parse_args()
+    data_dir = tempfile.mkdtemp(prefix="rag_bench_")
+
+    configure_environment(args, data_dir)
+
+    import rag_pipeline
+    from benchmarks.fakes import FakeElasticsearch, FakeOllamaServer, HashEmbeddingEngine, fake_connector_class
+    from benchmarks.synthetic import LogGenerator
+
+    llm = FakeOllamaServer(args.llm_prompt_ms, args.llm_token_ms, args.llm_tokens).start()
+    # Read by LLMInterface on construction
+    os.environ["LLM_PORT"] = str(llm.port)
+
+    report = {
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+
+    started = time.perf_counter()
+    generator = LogGenerator(seed=args.seed, span_hours=args.span_hours)
+    es_client = FakeElasticsearch(generator.generate(args.docs), latency_ms=args.es_latency_ms)
+    report["generate_seconds"] = time.perf_counter() - started
+
+    rag_pipeline.ElasticsearchConnector = fake_connector_class(es_client)
+    if not args.real_embeddings:
+        rag_pipeline.EmbeddingEngine = HashEmbeddingEngine
+
+    rss = RSSSampler()
+    started = time.perf_counter()
+    pipeline = rag_pipeline.RAGPipeline(lazy=True)
+    report["startup"] = {"construct_seconds": time.perf_counter() - started}
+    pipeline.warm_up()
+    report["startup"]["warm_up_seconds"] = time.perf_counter() - started
+    report["startup"]["phases"] = pipeline.startup.report()
+
+    started = time.perf_counter()
+    if args.ingest == "worker":
+        from ingest_worker import IngestWorker
+        worker = IngestWorker(pipeline)
+        ingested = worker.run_cycle(hours_back=args.span_hours + 1)
+        stages = worker.stats()
+    else:
+        ingested = pipeline.refresh_logs(hours_back=args.span_hours + 1)
+        stages = None
+    elapsed = time.perf_counter() - started
+    report["ingest"] = {
+        "mode": args.ingest,
+        "docs": ingested,
+        "seconds": elapsed,
+        "docs_per_sec": ingested / max(elapsed, 1e-9),
+        "stages": stages,
+    }
+
+    rng = random.Random(args.seed)
+    query_types = {
+        "transaction_id": lambda: f"transaction id: {rng.choice(generator.transids)}",
+        "error_logs": lambda: rng.choice(["any errors in the last 6 hours?", "lỗi trong 2 giờ qua",
+                                          "show failed topups today"]),
+        "filtered": lambda: rng.choice(["show logs from payment service in the last hour",
+                                        "logs of topup service today"]),
+        "semantic": lambda: rng.choice(["why are carrier responses slow", "topup timeout viettel",
+                                        "merchant balance running low", "authentication from 10.0.1.2"]),
+    }
+    report["queries"] = {}
+    for query_type, make_query in query_types.items():
+        samples = []
+        for _ in range(args.queries):
+            query = make_query()
+            started = time.perf_counter()
+            pipeline.process_query(query)
+            samples.append(time.perf_counter() - started)
+        report["queries"][query_type] = percentiles(samples)
+
+    report["es_searches"] = es_client.searches
+    report["llm_requests"] = llm.requests
+    report["rss_baseline_mb"] = rss.baseline
+    report["peak_rss_growth_mb"] = rss.stop()
+    llm.stop()
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
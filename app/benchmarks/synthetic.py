@@ -0,0 +1,72 @@
+"""Synthetic topup-application logs for benchmarks."""
+import random
+from datetime import datetime, timedelta, timezone
+
+SERVICES = ["topup", "payment", "auth", "notify", "billing", "gateway"]
+CARRIERS = ["viettel", "mobifone", "vinaphone"]
+
+# (level, weight, message template); {placeholders} are filled per log
+MESSAGES = [
+    ("INFO", 40, "Received topup request amount={amount} phone={phone} carrier={carrier}"),
+    ("INFO", 25, "Topup completed amount={amount} phone={phone} in {ms} ms"),
+    ("INFO", 10, "User {user} authenticated from {ip}"),
+    ("DEBUG", 8, "Cache lookup key=balance:{user} hit={hit}"),
+    ("WARN", 6, "Carrier {carrier} slow response {ms} ms, retrying ({attempt}/3)"),
+    ("WARN", 3, "Balance low for merchant {merchant}: {amount} VND left"),
+    ("ERROR", 4, "Topup failed E1023 timeout after {ms} ms calling {carrier}"),
+    ("ERROR", 2, "Payment declined code={code} for transaction"),
+    ("ERROR", 1, "NullPointerException in TopupService.process at line {line}"),
+    ("ERROR", 1, "Connection refused to {ip}:5432"),
+]
+
+
+class LogGenerator:
+    """Deterministic generator of topup logs spread evenly over a time span.
+
+    Logs are produced in timestamp order and grouped into transactions of
+    1-6 logs sharing a transid, like a request flowing through services.
+    """
+
+    def __init__(self, seed=42, end=None, span_hours=24):
+        self.seed = seed
+        self.end = end or datetime.now(timezone.utc)
+        self.start = self.end - timedelta(hours=span_hours)
+        self.transids = []
+
+    def generate(self, count):
+        """Yield (doc_id, log) pairs, oldest first."""
+        rng = random.Random(self.seed)
+        levels, weights, templates = zip(*[(m[0], m[1], m[2]) for m in MESSAGES])
+        step_ms = (self.end - self.start).total_seconds() * 1000 / max(count, 1)
+        transid = None
+        remaining = 0
+        for i in range(count):
+            if remaining == 0:
+                transid = f"TX-{rng.randrange(16 ** 10):010X}"
+                remaining = rng.randint(1, 6)
+                if len(self.transids) < 10000:
+                    self.transids.append(transid)
+            remaining -= 1
+
+            index = rng.choices(range(len(MESSAGES)), weights=weights)[0]
+            timestamp = self.start + timedelta(milliseconds=i * step_ms)
+            message = templates[index].format(
+                amount=rng.choice([10000, 20000, 50000, 100000, 200000, 500000]),
+                phone=f"09{rng.randrange(10 ** 8):08d}",
+                carrier=rng.choice(CARRIERS),
+                ms=rng.randint(50, 30000),
+                user=f"u{rng.randrange(100000)}",
+                ip=f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+                hit=rng.choice(["true", "false"]),
+                attempt=rng.randint(1, 3),
+                merchant=f"m{rng.randrange(500)}",
+                code=rng.choice(["51", "05", "91", "96"]),
+                line=rng.randint(10, 900),
+            )
+            yield f"doc-{i}", {
+                "@timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S.") + f"{timestamp.microsecond // 1000:03d}Z",
+                "level": levels[index],
+                "service": rng.choice(SERVICES),
+                "transid": transid,
+                "message": message,
+            }
@@ -0,0 +1,114 @@
+"""Benchmark the in-process vector index against the Chroma HTTP server.
+
+Run from the app directory:
+
+    python -m benchmarks.vector_backends --docs 50000 --queries 200
+
+Both backends get the same synthetic normalized vectors and log-like
+metadata. Reports write throughput, unfiltered and filtered query latency
+percentiles and (for the local index) reload time, as JSON on stdout.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_index import LocalIndexClient
+
+SERVICES = ["topup", "payment", "auth", "notify"]
+LEVELS = ["INFO", "WARN", "ERROR"]
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q) * 1000) if samples else 0.0
+
+
+def synthetic_batch(rng, start, count, dimension):
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"doc-{start + i}" for i in range(count)]
+    metadatas = [
+        {
+            "_ts_ms": 1700000000000 + (start + i) * 1000,
+            "_service": SERVICES[(start + i) % len(SERVICES)],
+            "_level": LEVELS[(start + i) % len(LEVELS)],
+            "message": f"synthetic log {start + i}"
+        }
+        for i in range(count)
+    ]
+    documents = [m["message"] for m in metadatas]
+    return ids, vectors, documents, metadatas
+
+
+def run(name, collection, args):
+    rng = np.random.default_rng(42)
+    start = time.perf_counter()
+    for offset in range(0, args.docs, args.batch_size):
+        count = min(args.batch_size, args.docs - offset)
+        ids, vectors, documents, metadatas = synthetic_batch(rng, offset, count, args.dimension)
+        collection.upsert(ids=ids, embeddings=vectors.tolist(), documents=documents, metadatas=metadatas)
+    write_seconds = time.perf_counter() - start
+
+    queries = rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    where = {"$and": [{"_service": "payment"}, {"_ts_ms": {"$gte": 1700000000000 + args.docs * 500}}]}
+    latencies = {"unfiltered": [], "filtered": []}
+    for query in queries:
+        for kind, clause in (("unfiltered", None), ("filtered", where)):
+            started = time.perf_counter()
+            collection.query(query_embeddings=[query.tolist()], n_results=args.k, where=clause)
+            latencies[kind].append(time.perf_counter() - started)
+
+    return {
+        "backend": name,
+        "docs": args.docs,
+        "write_docs_per_sec": args.docs / max(write_seconds, 1e-9),
+        "query_ms": {
+            kind: {"p50": percentile(samples, 50), "p95": percentile(samples, 95), "p99": percentile(samples, 99)}
+            for kind, samples in latencies.items()
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--skip-chroma", action="store_true", help="only benchmark the local index")
+    args = parser.parse_args()
+
+    results = []
+    path = tempfile.mkdtemp(prefix="vector_bench_")
+    try:
+        client = LocalIndexClient(path)
+        results.append(run("local", client.create_collection("bench"), args))
+        started = time.perf_counter()
+        reloaded = LocalIndexClient(path).get_collection("bench")
+        results[-1]["reload_seconds"] = time.perf_counter() - started
+        results[-1]["reloaded_count"] = reloaded.count()
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    if not args.skip_chroma:
+        import chromadb
+        client = chromadb.HttpClient(host=os.getenv("CHROMA_HOST", "localhost"), port=int(os.getenv("CHROMA_PORT", "8000")))
+        name = f"bench_{int(time.time())}"
+        try:
+            results.append(run("chroma_http", client.create_collection(name), args))
+        finally:
+            client.delete_collection(name)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
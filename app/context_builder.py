@@ -0,0 +1,113 @@
+import os
+import re
+import logging
+from dotenv import load_dotenv
+from vector_store import PRIORITY_FIELDS
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Free-text fields joined into the message part of a context line
+TEXT_FIELDS = [f for f in PRIORITY_FIELDS if f in ("message", "log", "details")]
+
+
+def estimate_tokens(text):
+    """Rough token count for llama-style tokenizers (about 4 chars per token)."""
+    return (len(text) + 3) // 4
+
+
+class PackedContext:
+    """Compact LLM context produced by ContextBuilder."""
+
+    def __init__(self, text, logs_used, logs_total, lines, tokens_used, token_budget, summary=None):
+        self.text = text
+        self.summary = summary
+        self.logs_used = logs_used
+        self.logs_total = logs_total
+        self.lines = lines
+        self.tokens_used = tokens_used
+        self.token_budget = token_budget
+
+    def stats(self):
+        return {
+            "logs_used": self.logs_used,
+            "logs_total": self.logs_total,
+            "lines": self.lines,
+            "tokens_used": self.tokens_used,
+            "token_budget": self.token_budget,
+            "summary": self.summary is not None
+        }
+
+
+class ContextBuilder:
+    """Pack logs into a compact, line-per-log context within a token budget.
+
+    Each log is projected onto the priority fields used by
+    VectorStore._log_to_text and rendered as one line:
+
+        2024-05-05T10:00:00Z ERROR topup transid=ABC-123 | message text
+
+    Logs with identical lines apart from the timestamp are collapsed into one
+    line with a count and time span. Lines are packed in the given (relevance)
+    order until CONTEXT_TOKEN_BUDGET is reached. An optional pre-computed
+    summary (e.g. error aggregations) is placed first and counts against the
+    same budget, leaving the rest for exemplar lines.
+    """
+
+    def __init__(self, token_budget=None):
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+        self.max_text_chars = int(os.getenv("CONTEXT_MAX_TEXT_CHARS", "300"))
+
+    def _project(self, log):
+        """Return (timestamp, line body) for a log."""
+        timestamp = str(log.get("@timestamp") or "")
+        parts = []
+        for field in ("level", "service"):
+            if log.get(field):
+                parts.append(str(log[field]))
+        if log.get("transid"):
+            parts.append(f"transid={log['transid']}")
+        text = " ".join(str(log[f]) for f in TEXT_FIELDS if log.get(f))
+        text = re.sub(r"\s+", " ", text).strip()
+        if len(text) > self.max_text_chars:
+            text = text[:self.max_text_chars] + "…"
+        body = " ".join(parts)
+        if text:
+            body = f"{body} | {text}" if body else text
+        return timestamp, body
+
+    def build(self, logs, summary=None):
+        """Build a PackedContext from logs ordered by relevance and an optional summary text."""
+        # Group identical lines, keeping first-seen (relevance) order
+        groups = {}
+        for log in logs:
+            timestamp, body = self._project(log)
+            group = groups.setdefault(body, {"count": 0, "first": timestamp, "last": timestamp})
+            group["count"] += 1
+            if timestamp:
+                group["first"] = min(group["first"] or timestamp, timestamp)
+                group["last"] = max(group["last"], timestamp)
+
+        lines = []
+        tokens_used = estimate_tokens(summary) + 1 if summary else 0
+        logs_used = 0
+        for body, group in groups.items():
+            if group["count"] > 1:
+                span = f"{group['first']}..{group['last']}" if group["first"] != group["last"] else group["first"]
+                line = f"{span} (x{group['count']}) {body}"
+            else:
+                line = f"{group['first']} {body}".strip()
+            line_tokens = estimate_tokens(line) + 1
+            if tokens_used + line_tokens > self.token_budget:
+                continue
+            lines.append(line)
+            tokens_used += line_tokens
+            logs_used += group["count"]
+
+        packed = PackedContext(
+            "\n".join(lines), logs_used, len(logs), len(lines), tokens_used, self.token_budget, summary
+        )
+        logger.info(f"Packed {logs_used}/{len(logs)} logs into {len(lines)} lines, ~{tokens_used}/{self.token_budget} tokens")
+        return packed
@@ -2,9 +2,9 @@ import os
 from elasticsearch import Elasticsearch
 from dotenv import load_dotenv
 import logging
-import requests
 from requests.auth import HTTPBasicAuth
 import json
+from http_client import get_session, get_timeout
 
 load_dotenv()
 
@@ -18,6 +18,10 @@ class ElasticsearchConnector:
         self.es_username = os.getenv("ES_USERNAME")
         self.es_password = os.getenv("ES_PASSWORD")
         self.es_index = os.getenv("ES_INDEX")
+        self.scan_batch_size = int(os.getenv("ES_SCAN_BATCH_SIZE", "1000"))
+        self.scan_keep_alive = os.getenv("ES_SCAN_KEEP_ALIVE", "2m")
+        self.transid_field = os.getenv("ES_TRANSID_FIELD", "transid.keyword")
+        self.transid_max_docs = int(os.getenv("ES_TRANSID_MAX_DOCS", "1000"))
         
         self.client = self._connect()
         
@@ -35,10 +39,10 @@ class ElasticsearchConnector:
             
             # Thử kiểm tra kết nối trực tiếp với requests trước
             try:
-                response = requests.get(
+                response = get_session("elasticsearch").get(
                     f"http://{es_host}:{self.es_port}",
                     auth=HTTPBasicAuth(self.es_username, self.es_password),
-                    timeout=10
+                    timeout=get_timeout(10)
                 )
                 logger.info(f"Direct request to Elasticsearch: status={response.status_code}, response={response.text[:100]}")
             except Exception as req_error:
@@ -51,7 +55,8 @@ class ElasticsearchConnector:
                 verify_certs=False,
                 request_timeout=30,
                 retry_on_timeout=True,
-                max_retries=3
+                max_retries=3,
+                connections_per_node=int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
             )
             
             # Kiểm tra kết nối
@@ -78,12 +83,20 @@ class ElasticsearchConnector:
             logger.error(f"Exception type: {type(e).__name__}")
             return None
     
-    def query_logs(self, query_dict, size=100):
-        """Query logs from Elasticsearch using a query dictionary."""
+    def query_logs(self, query_dict, size=100, include_ids=False):
+        """Query logs from Elasticsearch using a query dictionary.
+
+        When include_ids is True the document ``_id`` is copied into each
+        returned log under the ``_id`` key. Requests larger than one scan batch
+        are paged through scan_logs instead of a single oversized search.
+        """
         if not self.client:
             logger.error("Elasticsearch client not connected")
             return []
         
+        if size > self.scan_batch_size:
+            return list(self.scan_logs(query_dict, include_ids=include_ids, max_docs=size))
+        
         try:
             logger.info(f"Querying Elasticsearch with: {json.dumps(query_dict)[:200]}...")
             
@@ -96,39 +109,171 @@ class ElasticsearchConnector:
             
             hits = response.get('hits', {}).get('hits', [])
             logger.info(f"Retrieved {len(hits)} logs from Elasticsearch")
-            return [hit['_source'] for hit in hits]
+            return [self._hit_to_log(hit, include_ids) for hit in hits]
         except Exception as e:
             logger.error(f"Error querying Elasticsearch: {e}")
             return []
     
-    def get_logs_by_time_range(self, start_time, end_time, size=100):
-        """Get logs within a specific time range."""
+    def _hit_to_log(self, hit, include_ids=False):
+        """Extract the log document from a search hit."""
+        log = hit['_source']
+        if include_ids:
+            log = dict(log)
+            log['_id'] = hit['_id']
+        return log
+    
+    def scan_log_batches(self, query_dict, batch_size=None, include_ids=False, max_docs=None, raise_errors=False):
+        """Lazily page through all logs matching a query.
+
+        Uses a point-in-time with search_after on the query's sort plus the
+        ``_shard_doc`` tiebreaker, yielding one list of logs per page. The PIT
+        is closed when the generator is exhausted or closed early.
+
+        Errors are logged and end the scan early; pass raise_errors=True when
+        a truncated scan must not look like a complete one.
+        """
+        if not self.client:
+            logger.error("Elasticsearch client not connected")
+            if raise_errors:
+                raise RuntimeError("Elasticsearch client not connected")
+            return
+        
+        batch_size = batch_size or self.scan_batch_size
+        pit_id = None
+        try:
+            pit_id = self.client.open_point_in_time(
+                index=self.es_index,
+                keep_alive=self.scan_keep_alive
+            )["id"]
+            
+            body = dict(query_dict)
+            body["sort"] = list(query_dict.get("sort", [])) + [{"_shard_doc": "asc"}]
+            search_after = None
+            yielded = 0
+            
+            while max_docs is None or yielded < max_docs:
+                page_size = batch_size if max_docs is None else min(batch_size, max_docs - yielded)
+                body["pit"] = {"id": pit_id, "keep_alive": self.scan_keep_alive}
+                if search_after is not None:
+                    body["search_after"] = search_after
+                
+                response = self.client.search(
+                    body=body,
+                    size=page_size,
+                    request_timeout=30
+                )
+                pit_id = response.get("pit_id", pit_id)
+                hits = response.get('hits', {}).get('hits', [])
+                if not hits:
+                    break
+                
+                yielded += len(hits)
+                search_after = hits[-1]["sort"]
+                logger.debug(f"Scanned {len(hits)} logs ({yielded} total)")
+                yield [self._hit_to_log(hit, include_ids) for hit in hits]
+                
+                if len(hits) < page_size:
+                    break
+        except Exception as e:
+            logger.error(f"Error scanning Elasticsearch: {e}")
+            if raise_errors:
+                raise
+        finally:
+            if pit_id:
+                try:
+                    self.client.close_point_in_time(id=pit_id)
+                except Exception as close_error:
+                    logger.warning(f"Could not close point in time: {close_error}")
+    
+    def scan_logs(self, query_dict, batch_size=None, include_ids=False, max_docs=None):
+        """Lazily yield individual logs matching a query, see scan_log_batches."""
+        for batch in self.scan_log_batches(query_dict, batch_size, include_ids, max_docs):
+            yield from batch
+    
+    def scan_logs_since(self, start_time, batch_size=None):
+        """Page through logs at or after start_time, oldest first, with their ``_id``."""
+        query = {
+            "query": {
+                "range": {
+                    "@timestamp": {
+                        "gte": start_time
+                    }
+                }
+            },
+            "sort": [{"@timestamp": {"order": "asc"}}]
+        }
+        return self.scan_log_batches(query, batch_size, include_ids=True)
+    
+    def scan_logs_between(self, start_time, end_time, batch_size=None, raise_errors=False):
+        """Page through logs in [start_time, end_time), oldest first, with their ``_id``."""
         query = {
             "query": {
                 "range": {
                     "@timestamp": {
                         "gte": start_time,
-                        "lte": end_time
+                        "lt": end_time
                     }
                 }
             },
+            "sort": [{"@timestamp": {"order": "asc"}}]
+        }
+        return self.scan_log_batches(query, batch_size, include_ids=True, raise_errors=raise_errors)
+    
+    def _apply_filters(self, query_dict, filters):
+        """Restrict a query with filter clauses (e.g. from QueryPlan.to_es_filters)."""
+        if not filters:
+            return query_dict
+        filtered = dict(query_dict)
+        filtered["query"] = {
+            "bool": {
+                "must": [query_dict.get("query", {"match_all": {}})],
+                "filter": list(filters)
+            }
+        }
+        return filtered
+    
+    def get_logs_filtered(self, filters, size=100):
+        """Get the most recent logs matching filter clauses only."""
+        query = {
+            "query": {"match_all": {}},
             "sort": [{"@timestamp": {"order": "desc"}}]
         }
-        return self.query_logs(query, size)
+        return self.query_logs(self._apply_filters(query, filters), size, include_ids=True)
     
-    def get_logs_by_transaction_id(self, transaction_id):
-        """Get logs for a specific transaction ID."""
+    def get_logs_by_time_range(self, start_time, end_time, size=100):
+        """Get logs within a specific time range."""
         query = {
             "query": {
-                "match": {
-                    "transid": transaction_id
+                "range": {
+                    "@timestamp": {
+                        "gte": start_time,
+                        "lte": end_time
+                    }
                 }
             },
             "sort": [{"@timestamp": {"order": "desc"}}]
         }
-        return self.query_logs(query)
+        return self.query_logs(query, size)
     
-    def get_logs_by_keyword(self, keyword, size=100):
+    def get_logs_by_transaction_id(self, transaction_id, since=None):
+        """Get the complete, oldest-first timeline of a transaction.
+
+        Uses an exact term query on the transid keyword field, paged through
+        scan_logs up to ES_TRANSID_MAX_DOCS logs. With since, only logs at or
+        after that timestamp are returned.
+        """
+        term = {"term": {self.transid_field: transaction_id}}
+        if since:
+            condition = {"bool": {"filter": [term, {"range": {"@timestamp": {"gte": since}}}]}}
+        else:
+            condition = term
+        query = {
+            "query": condition,
+            "sort": [{"@timestamp": {"order": "asc"}}]
+        }
+        return list(self.scan_logs(query, include_ids=True, max_docs=self.transid_max_docs))
+    
+    def get_logs_by_keyword(self, keyword, size=100, filters=None):
         """Get logs containing a specific keyword."""
         query = {
             "query": {
@@ -139,20 +284,67 @@ class ElasticsearchConnector:
             },
             "sort": [{"@timestamp": {"order": "desc"}}]
         }
-        return self.query_logs(query, size)
+        return self.query_logs(self._apply_filters(query, filters), size)
     
-    def get_error_logs(self, size=100):
-        """Get error logs."""
+    def search_logs(self, query_text, size=20, filters=None):
+        """Full-text search ranked by relevance (BM25), with ``_id`` included."""
         query = {
             "query": {
-                "bool": {
-                    "should": [
-                        {"match": {"level": "ERROR"}},
-                        {"match": {"severity": "ERROR"}},
-                        {"match": {"message": "error"}}
-                    ]
+                "multi_match": {
+                    "query": query_text,
+                    "fields": ["message", "log", "details", "transid"],
+                    "lenient": True
                 }
-            },
+            }
+        }
+        return self.query_logs(self._apply_filters(query, filters), size, include_ids=True)
+    
+    def _error_query(self):
+        """Query clause matching error logs."""
+        return {
+            "bool": {
+                "should": [
+                    {"match": {"level": "ERROR"}},
+                    {"match": {"severity": "ERROR"}},
+                    {"match": {"message": "error"}}
+                ]
+            }
+        }
+    
+    def get_error_logs(self, size=100, filters=None):
+        """Get error logs."""
+        query = {
+            "query": self._error_query(),
             "sort": [{"@timestamp": {"order": "desc"}}]
         }
-        return self.query_logs(query, size)
+        return self.query_logs(self._apply_filters(query, filters), size)
+    
+    def aggregate_logs(self, query_dict, aggs, filters=None):
+        """Run aggregations server-side without fetching any documents.
+
+        Returns (total matching logs, aggregations), or (0, None) on error.
+        """
+        if not self.client:
+            logger.error("Elasticsearch client not connected")
+            return 0, None
+        
+        try:
+            body = dict(self._apply_filters(query_dict, filters), aggs=aggs, track_total_hits=True)
+            logger.info(f"Aggregating in Elasticsearch with: {json.dumps(body)[:200]}...")
+            
+            response = self.client.search(
+                index=self.es_index,
+                body=body,
+                size=0,
+                request_timeout=30
+            )
+            
+            total = response.get('hits', {}).get('total', {}).get('value', 0)
+            return total, response.get('aggregations', {})
+        except Exception as e:
+            logger.error(f"Error aggregating in Elasticsearch: {e}")
+            return 0, None
+    
+    def get_error_aggregations(self, aggs, filters=None):
+        """Aggregate over all error logs matching filter clauses."""
+        return self.aggregate_logs({"query": self._error_query()}, aggs, filters)
@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+
+
+def normalize_text(text):
+    """Normalize text for cache keys by collapsing whitespace."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class EmbeddingCache:
+    """On-disk SQLite cache of embeddings keyed by model and normalized text.
+
+    Vectors are stored as float32 blobs. The cache is bounded to max_entries
+    rows with least-recently-used eviction, and keeps hit/miss counters.
+    """
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or os.getenv(
+            "EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite")
+        )
+        self.max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Embedding cache at {self.path} holds {self._size} entries")
+
+    @staticmethod
+    def make_key(model_name, text, normalized=True):
+        material = f"{model_name}|{int(normalized)}|{normalize_text(text)}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys, chunk_size=500):
+        """Return a dict of key -> vector for the keys present in the cache."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), chunk_size):
+                chunk = keys[i:i + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs, evicting least recently used entries."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items]
+            )
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._size -= excess
+                logger.debug(f"Evicted {excess} entries from embedding cache")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
+class EmbeddingError(RuntimeError):
+    """Texts could not be embedded; nothing should be stored for them."""
+
+
+class EmbeddingEngine:
+    """Single SentenceTransformer encoder shared by ingestion and queries.
+
+    Texts are encoded in batches of EMBEDDING_BATCH_SIZE, optionally
+    L2-normalized, on EMBEDDING_THREADS CPU threads (0 keeps the torch
+    default). Cumulative counters give the ingest throughput in docs/sec.
+    When EMBEDDING_CACHE_ENABLED is set, vectors are looked up in an
+    EmbeddingCache first and only cache misses are run through the model.
+    encode raises EmbeddingError when the model is missing or fails, so
+    callers never store placeholder vectors.
+    """
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name or os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self.normalize = os.getenv("EMBEDDING_NORMALIZE", "true").lower() == "true"
+        self.num_threads = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+        self.docs_encoded = 0
+        self.encode_seconds = 0.0
+        self._lock = threading.Lock()
+
+        self.model = self._load_model()
+        self.cache = self._open_cache()
+
+    def _load_model(self):
+        """Load the SentenceTransformer model, returning None on failure."""
+        try:
+            if self.num_threads > 0:
+                import torch
+                torch.set_num_threads(self.num_threads)
+                logger.info(f"Using {self.num_threads} CPU threads for embeddings")
+
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.model_name)
+            logger.info(f"Loaded embedding model: {self.model_name}")
+            return model
+        except Exception as e:
+            logger.error(f"Error loading embedding model: {e}")
+            return None
+
+    def _open_cache(self):
+        """Open the embedding cache if enabled, returning None otherwise."""
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() != "true":
+            return None
+        try:
+            return EmbeddingCache()
+        except Exception as e:
+            logger.error(f"Error opening embedding cache: {e}")
+            return None
+
+    @property
+    def available(self):
+        return self.model is not None
+
+    @property
+    def dimension(self):
+        if self.model is None:
+            return 384
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        """Encode a list of texts into a list of embedding vectors."""
+        if not texts:
+            return []
+
+        if self.model is None or self.cache is None:
+            return self._encode(texts)
+
+        keys = [EmbeddingCache.make_key(self.model_name, text, self.normalize) for text in texts]
+        try:
+            cached = self.cache.get_many(keys)
+        except Exception as e:
+            logger.error(f"Error reading embedding cache: {e}")
+            return self._encode(texts)
+
+        # Encode each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            # _encode raises on failure, so only vectors the model produced get cached
+            vectors = self._encode(list(missing.values()))
+            if len(vectors) != len(missing):
+                raise EmbeddingError(f"Encoder returned {len(vectors)} vectors for {len(missing)} texts")
+            encoded = dict(zip(missing, vectors))
+            cached.update(encoded)
+            try:
+                self.cache.put_many(list(encoded.items()))
+            except Exception as e:
+                logger.error(f"Error writing embedding cache: {e}")
+
+        return [cached[key] for key in keys]
+
+    def _encode(self, texts):
+        """Run texts through the model in batches, raising EmbeddingError on failure."""
+        if self.model is None:
+            raise EmbeddingError("Embedding model not initialized")
+
+        start = time.perf_counter()
+        try:
+            vectors = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=self.normalize,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {e}")
+            raise EmbeddingError(f"Error generating embeddings: {e}") from e
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.docs_encoded += len(texts)
+            self.encode_seconds += elapsed
+        logger.debug(f"Encoded {len(texts)} texts in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} docs/sec)")
+        return vectors.tolist()
+
+    def throughput(self):
+        """Return the average encoding throughput in docs/sec."""
+        with self._lock:
+            if self.encode_seconds == 0:
+                return 0.0
+            return self.docs_encoded / self.encode_seconds
@@ -0,0 +1,121 @@
+import os
+import logging
+from dotenv import load_dotenv
+from log_templates import tokenize
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+class ErrorSummary:
+    """Counts and trends over all error logs in a window, plus a few exemplars."""
+
+    def __init__(self, total, by_service, by_level, patterns, timeline, interval):
+        self.total = total
+        self.by_service = by_service
+        self.by_level = by_level
+        self.patterns = patterns
+        self.timeline = timeline
+        self.interval = interval
+
+    @property
+    def exemplars(self):
+        """One representative log per error pattern, most frequent first."""
+        return [pattern["exemplar"] for pattern in self.patterns if pattern["exemplar"]]
+
+    def to_text(self):
+        """Render the summary as compact lines for the LLM context."""
+        lines = [f"Total error logs: {self.total}"]
+        if self.by_service:
+            lines.append("By service: " + ", ".join(f"{key}={count}" for key, count in self.by_service))
+        if self.by_level:
+            lines.append("By level: " + ", ".join(f"{key}={count}" for key, count in self.by_level))
+        if self.timeline:
+            lines.append(
+                f"Over time (per {self.interval}): "
+                + ", ".join(f"{timestamp}={count}" for timestamp, count in self.timeline)
+            )
+        if self.patterns:
+            lines.append("Top error patterns (count, first..last seen):")
+            for pattern in self.patterns:
+                lines.append(
+                    f"- (x{pattern['count']}) {pattern['first_seen']}..{pattern['last_seen']} {pattern['template']}"
+                )
+        return "\n".join(lines)
+
+
+class ErrorAnalytics:
+    """Summarize error logs with Elasticsearch aggregations.
+
+    Counts by service and level, an automatic date histogram and the most
+    frequent messages are computed server-side over the whole window. Messages
+    are then merged into templates by masking their variable parts, keeping
+    the ERROR_ANALYTICS_TOP_N largest patterns and one exemplar log each.
+    """
+
+    def __init__(self, es_connector):
+        self.es_connector = es_connector
+        self.top_n = int(os.getenv("ERROR_ANALYTICS_TOP_N", "10"))
+        self.buckets = int(os.getenv("ERROR_ANALYTICS_BUCKETS", "12"))
+        self.message_field = os.getenv("ES_MESSAGE_FIELD", "message.keyword")
+        self.service_field = os.getenv("ES_SERVICE_FIELD", "service.keyword")
+        self.level_field = os.getenv("ES_LEVEL_FIELD", "level.keyword")
+
+    def _aggs(self):
+        return {
+            "by_service": {"terms": {"field": self.service_field, "size": self.top_n}},
+            "by_level": {"terms": {"field": self.level_field, "size": self.top_n}},
+            "over_time": {"auto_date_histogram": {"field": "@timestamp", "buckets": self.buckets}},
+            "by_message": {
+                # Over-fetch messages: several can collapse into one template
+                "terms": {"field": self.message_field, "size": self.top_n * 5},
+                "aggs": {
+                    "first_seen": {"min": {"field": "@timestamp"}},
+                    "last_seen": {"max": {"field": "@timestamp"}},
+                    "exemplar": {"top_hits": {"size": 1, "sort": [{"@timestamp": {"order": "desc"}}]}}
+                }
+            }
+        }
+
+    def _patterns(self, buckets):
+        """Merge message buckets that share a template."""
+        patterns = {}
+        for bucket in buckets:
+            template = " ".join(tokenize(str(bucket["key"])))
+            first_seen = bucket.get("first_seen", {}).get("value_as_string", "")
+            last_seen = bucket.get("last_seen", {}).get("value_as_string", "")
+            hits = bucket.get("exemplar", {}).get("hits", {}).get("hits", [])
+            pattern = patterns.get(template)
+            if pattern is None:
+                patterns[template] = {
+                    "template": template,
+                    "count": bucket["doc_count"],
+                    "first_seen": first_seen,
+                    "last_seen": last_seen,
+                    "exemplar": hits[0]["_source"] if hits else None
+                }
+                continue
+            pattern["count"] += bucket["doc_count"]
+            pattern["first_seen"] = min(pattern["first_seen"] or first_seen, first_seen or pattern["first_seen"])
+            pattern["last_seen"] = max(pattern["last_seen"], last_seen)
+        return sorted(patterns.values(), key=lambda p: p["count"], reverse=True)[:self.top_n]
+
+    def summarize(self, filters=None):
+        """Return an ErrorSummary for error logs matching filters, or None if empty or on error."""
+        total, aggregations = self.es_connector.get_error_aggregations(self._aggs(), filters)
+        if not aggregations or not total:
+            return None
+
+        over_time = aggregations.get("over_time", {})
+        summary = ErrorSummary(
+            total,
+            [(b["key"], b["doc_count"]) for b in aggregations.get("by_service", {}).get("buckets", [])],
+            [(b["key"], b["doc_count"]) for b in aggregations.get("by_level", {}).get("buckets", [])],
+            self._patterns(aggregations.get("by_message", {}).get("buckets", [])),
+            [(b.get("key_as_string", b["key"]), b["doc_count"]) for b in over_time.get("buckets", [])],
+            over_time.get("interval", "bucket")
+        )
+        logger.info(f"Summarized {total} error logs into {len(summary.patterns)} patterns")
+        return summary
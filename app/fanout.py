@@ -0,0 +1,57 @@
+import os
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+class FanOut:
+    """Run independent retrieval calls concurrently on a shared thread pool.
+
+    Each call gets its own timeout (RETRIEVAL_TIMEOUT seconds by default),
+    measured from when the batch is submitted, so a batch takes as long as
+    its slowest call rather than the sum. Calls that fail or time out yield
+    their default value instead of raising. Calls run in a copy of the
+    caller's context, so their metrics spans land in the caller's trace.
+    """
+
+    def __init__(self, max_workers=None, timeout=None):
+        self.max_workers = max_workers or int(os.getenv("RETRIEVAL_WORKERS", "8"))
+        self.timeout = timeout or float(os.getenv("RETRIEVAL_TIMEOUT", "15"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fanout")
+
+    def run(self, calls, default=None):
+        """Run calls concurrently and return their results in call order.
+
+        calls is a list of (name, fn, args) or (name, fn, args, timeout)
+        tuples. Returns a dict mapping each name to its result, ordered as
+        the calls were given.
+        """
+        start = time.monotonic()
+        futures = []
+        for call in calls:
+            name, fn, args = call[:3]
+            timeout = call[3] if len(call) > 3 else self.timeout
+            futures.append((name, timeout, self._executor.submit(contextvars.copy_context().run, fn, *args)))
+
+        results = {}
+        for name, timeout, future in futures:
+            remaining = max(0.0, start + timeout - time.monotonic())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                logger.warning(f"Retrieval call '{name}' timed out after {timeout}s")
+                future.cancel()
+                results[name] = default
+            except Exception as e:
+                logger.error(f"Retrieval call '{name}' failed: {e}")
+                results[name] = default
+        logger.debug(f"Fan-out of {len(calls)} calls took {time.monotonic() - start:.2f}s")
+        return results
+
@@ -0,0 +1,58 @@
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session():
+    """Create a keep-alive session with a bounded pool and retry with backoff.
+
+    Connection errors are retried for any method; 502/503/504 responses are
+    only retried for idempotent methods.
+    """
+    retries = Retry(
+        total=int(os.getenv("HTTP_RETRIES", "3")),
+        backoff_factor=float(os.getenv("HTTP_RETRY_BACKOFF", "0.5")),
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=int(os.getenv("HTTP_POOL_CONNECTIONS", "4")),
+        pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", "16")),
+        max_retries=retries
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(name="default"):
+    """Return the shared pooled session for a named service."""
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = _build_session()
+            _sessions[name] = session
+            logger.debug(f"Created pooled HTTP session '{name}'")
+        return session
+
+
+def get_timeout(read_timeout=None):
+    """Return a (connect, read) timeout tuple from HTTP_CONNECT_TIMEOUT/HTTP_READ_TIMEOUT."""
+    connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    if read_timeout is None:
+        read_timeout = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+    return (connect_timeout, read_timeout)
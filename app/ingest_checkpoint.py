@@ -0,0 +1,84 @@
+import os
+import json
+import logging
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+
+
+class IngestCheckpoint:
+    """Persistent high-water mark for incremental log ingestion.
+
+    The checkpoint stores the ``@timestamp`` of the newest ingested log and the
+    ES ``_id`` values of all logs sharing that timestamp. The ids act as the
+    tiebreaker: the next cycle queries ``@timestamp >= timestamp`` and skips the
+    ids that were already ingested at the boundary.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(
+            "INGEST_CHECKPOINT_PATH", os.path.join(DATA_DIR, "ingest_checkpoint.json")
+        )
+        self.timestamp = None
+        self.boundary_ids = set()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the checkpoint from disk, starting empty if none exists."""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            self.timestamp = state.get("timestamp")
+            self.boundary_ids = set(state.get("boundary_ids", []))
+            logger.info(f"Loaded ingest checkpoint: {self.timestamp} ({len(self.boundary_ids)} boundary ids)")
+        except FileNotFoundError:
+            logger.info(f"No ingest checkpoint at {self.path}, starting fresh")
+        except Exception as e:
+            logger.error(f"Error loading ingest checkpoint: {e}")
+
+    def save(self):
+        """Atomically write the checkpoint to disk."""
+        with self._lock:
+            state = {
+                "timestamp": self.timestamp,
+                "boundary_ids": sorted(self.boundary_ids)
+            }
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving ingest checkpoint: {e}")
+
+    def is_new(self, log):
+        """Return True if the log has not been ingested yet."""
+        return log.get("_id") not in self.boundary_ids or log.get("@timestamp") != self.timestamp
+
+    def advance(self, logs):
+        """Move the high-water mark past logs sorted by ascending ``@timestamp``."""
+        with self._lock:
+            for log in logs:
+                timestamp = log.get("@timestamp")
+                if not timestamp:
+                    continue
+                if timestamp != self.timestamp:
+                    self.timestamp = timestamp
+                    self.boundary_ids = set()
+                if log.get("_id"):
+                    self.boundary_ids.add(log["_id"])
+
+    def reset(self):
+        """Forget the high-water mark so the next cycle starts from scratch."""
+        with self._lock:
+            self.timestamp = None
+            self.boundary_ids = set()
+        self.save()
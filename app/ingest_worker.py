@@ -0,0 +1,269 @@
+import os
+import time
+import queue
+import logging
+import threading
+import contextvars
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from rag_pipeline import RAGPipeline
+import metrics
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Marks the end of a cycle on each stage queue
+DONE = object()
+
+
+class StageCounter:
+    """Throughput counters for one ingest stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.docs = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, docs, busy_seconds, blocked_seconds):
+        with self._lock:
+            self.batches += 1
+            self.docs += docs
+            self.busy_seconds += busy_seconds
+            self.blocked_seconds += blocked_seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "docs": self.docs,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "blocked_seconds": round(self.blocked_seconds, 3),
+                "docs_per_sec": self.docs / self.busy_seconds if self.busy_seconds else 0.0
+            }
+
+
+class IngestBatch:
+    """One page of new logs moving through the stages."""
+
+    def __init__(self, logs):
+        self.logs = logs
+        # (collection, ids, documents, metadatas, embeddings) per target collection
+        self.writes = []
+        # Template mode: templates touched by this page
+        self.templates = None
+
+
+class IngestWorker:
+    """Staged ingestion: fetch -> transform -> embed -> write.
+
+    Each stage runs on its own thread and hands batches to the next through
+    a queue bounded to INGEST_QUEUE_SIZE batches, so a slow stage blocks the
+    ones before it instead of buffering without limit (backpressure). Fetch
+    pages through Elasticsearch from the checkpoint in INGEST_BATCH_SIZE
+    pages while earlier pages are still being embedded and written. Write is
+    the only stage touching the checkpoint and runs in fetch order, so the
+    checkpoint never gets ahead of what is stored.
+
+    Per-stage counters record batches, docs, busy time and time spent
+    blocked on a full downstream queue; the stage with the least blocked time
+    is the bottleneck.
+    """
+
+    STAGES = ("fetch", "transform", "embed", "write")
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.queue_size = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+        self.counters = {name: StageCounter(name) for name in self.STAGES}
+        self._start_time = None
+        self._error = None
+
+    def _put(self, target, item):
+        """Put an item downstream, returning the seconds spent blocked."""
+        start = time.perf_counter()
+        target.put(item)
+        return time.perf_counter() - start
+
+    def _fetch(self, out):
+        pipeline = self.pipeline
+        pages = iter(pipeline.es_connector.scan_logs_since(self._start_time, batch_size=pipeline.ingest_batch_size))
+        while True:
+            with metrics.span("es_fetch"):
+                logs = next(pages, None)
+            if logs is None:
+                break
+            start = time.perf_counter()
+            new_logs = [log for log in logs if pipeline.checkpoint.is_new(log)]
+            busy = time.perf_counter() - start
+            if not new_logs:
+                continue
+            blocked = self._put(out, IngestBatch(new_logs))
+            self.counters["fetch"].record(len(new_logs), busy, blocked)
+            if self._error:
+                break
+        out.put(DONE)
+
+    def _transform(self, source, out):
+        pipeline = self.pipeline
+        while True:
+            batch = source.get()
+            if batch is DONE:
+                out.put(DONE)
+                return
+            start = time.perf_counter()
+            with metrics.span("transaction_index"):
+                pipeline.transaction_index.add_logs(batch.logs)
+            if pipeline.template_miner:
+                with metrics.span("template_mining"):
+                    batch.templates = pipeline.template_miner.add_logs(batch.logs)
+            else:
+                with metrics.span("plan_writes"):
+                    batch.writes = [
+                        (collection, ids, documents, metadatas, None)
+                        for collection, ids, documents, metadatas in pipeline.vector_store.plan_writes(batch.logs)
+                    ]
+            busy = time.perf_counter() - start
+            blocked = self._put(out, batch)
+            self.counters["transform"].record(len(batch.logs), busy, blocked)
+
+    def _embed(self, source, out):
+        engine = self.pipeline.vector_store.embedding_engine
+        while True:
+            batch = source.get()
+            if batch is DONE:
+                out.put(DONE)
+                return
+            start = time.perf_counter()
+            documents = [document for write in batch.writes for document in write[2]]
+            if documents and engine.available:
+                # One encode call for the whole page, split back per collection
+                with metrics.span("embed"):
+                    vectors = engine.encode(documents)
+                offset = 0
+                for i, (collection, ids, texts, metadatas, _) in enumerate(batch.writes):
+                    batch.writes[i] = (collection, ids, texts, metadatas, vectors[offset:offset + len(ids)])
+                    offset += len(ids)
+            busy = time.perf_counter() - start
+            blocked = self._put(out, batch)
+            self.counters["embed"].record(len(documents), busy, blocked)
+
+    def _write(self, source):
+        pipeline = self.pipeline
+        total = 0
+        while True:
+            batch = source.get()
+            if batch is DONE:
+                return total
+            start = time.perf_counter()
+            if batch.templates is not None:
+                with metrics.span("template_write"):
+                    pipeline.vector_store.add_templates(batch.templates)
+            for collection, ids, documents, metadatas, embeddings in batch.writes:
+                pipeline.vector_store.write_batch(collection, ids, documents, metadatas, embeddings)
+            with metrics.span("checkpoint"):
+                pipeline.checkpoint.advance(batch.logs)
+                pipeline.checkpoint.save()
+            total += len(batch.logs)
+            self.counters["write"].record(len(batch.logs), time.perf_counter() - start, 0.0)
+
+    def _run_stage(self, name, fn, source, out):
+        """Run a stage; on failure end the cycle downstream and keep draining upstream."""
+        try:
+            if source is None:
+                fn(out)
+            else:
+                fn(source, out)
+        except Exception as e:
+            logger.error(f"Ingest stage {name} failed: {e}")
+            self._error = e
+            out.put(DONE)
+            if source is not None:
+                while source.get() is not DONE:
+                    pass
+
+    def run_cycle(self, hours_back=24):
+        """Ingest everything newer than the checkpoint. Returns the number of logs written."""
+        pipeline = self.pipeline
+        if pipeline.es_connector is None or pipeline.vector_store is None:
+            logger.warning("Skipping ingest cycle: Elasticsearch or vector store not ready yet")
+            return 0
+
+        start_time = pipeline.checkpoint.timestamp
+        if start_time is None:
+            start_time = (datetime.now() - timedelta(hours=hours_back)).isoformat()
+
+        self._error = None
+        self._start_time = start_time
+        with metrics.trace("ingest", "worker"):
+            queues = [queue.Queue(maxsize=self.queue_size) for _ in range(3)]
+            stages = [
+                ("fetch", self._fetch, None, queues[0]),
+                ("transform", self._transform, queues[0], queues[1]),
+                ("embed", self._embed, queues[1], queues[2]),
+            ]
+            # Stage threads run in copies of this context so their spans join the cycle's trace
+            threads = [
+                threading.Thread(target=contextvars.copy_context().run, args=(self._run_stage,) + stage, name=f"ingest-{stage[0]}")
+                for stage in stages
+            ]
+            for thread in threads:
+                thread.start()
+
+            started = time.perf_counter()
+            total = 0
+            try:
+                total = self._write(queues[2])
+            except Exception as e:
+                logger.error(f"Ingest stage write failed: {e}")
+                self._error = e
+                # Drain so upstream stages can finish
+                while queues[2].get() is not DONE:
+                    pass
+            for thread in threads:
+                thread.join()
+
+            with metrics.span("retention"):
+                dropped = pipeline.apply_retention()
+        if dropped and not total:
+            # Touch the checkpoint so query processes notice the change
+            pipeline.checkpoint.save()
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Ingest cycle wrote {total} logs in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} docs/sec), "
+            f"checkpoint at {pipeline.checkpoint.timestamp}"
+        )
+        for name in self.STAGES:
+            logger.info(f"Stage {name}: {self.counters[name].stats()}")
+        return total
+
+    def stats(self):
+        return {name: counter.stats() for name, counter in self.counters.items()}
+
+
+def main():
+    """Run the ingest worker: warm up, then ingest every REFRESH_INTERVAL seconds."""
+    refresh_interval = int(os.getenv("REFRESH_INTERVAL", "300"))
+    metrics.start_server()
+    pipeline = RAGPipeline(lazy=True)
+    pipeline.warm_up(include_llm=False)
+    worker = IngestWorker(pipeline)
+
+    while True:
+        if pipeline.warm_up_pending(include_llm=False):
+            # Retry only the phases that failed to come up
+            pipeline.warm_up(include_llm=False)
+        try:
+            worker.run_cycle()
+        except Exception as e:
+            logger.error(f"Error in ingest cycle: {e}")
+        logger.info(f"Next ingest cycle in {refresh_interval} seconds")
+        time.sleep(refresh_interval)
+
+
+if __name__ == "__main__":
+    main()
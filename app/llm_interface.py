@@ -1,23 +1,55 @@
 import os
-import requests
 import json
 import logging
 from dotenv import load_dotenv
+from context_builder import ContextBuilder, PackedContext
+from http_client import get_session, get_timeout
+import metrics
 
 load_dotenv()
 
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 
+# Fallback answers returned instead of raising; never worth caching
+ERROR_RESPONSES = {
+    "Sorry, I couldn't generate a response.",
+    "Sorry, there was an error generating a response.",
+    "Sorry, there was an error communicating with the LLM."
+}
+
+def is_error_response(text):
+    """Return True if text is one of the LLMInterface fallback answers."""
+    return text in ERROR_RESPONSES
+
 class LLMInterface:
     def __init__(self):
         self.llm_host = os.getenv("LLM_HOST")
         self.llm_port = os.getenv("LLM_PORT")
         self.model = os.getenv("LLM_MODEL")
         self.api_base = f"http://{self.llm_host}:{self.llm_port}"
+        self.context_builder = ContextBuilder()
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.session = get_session("ollama")
+        # Generation on CPU can take minutes; the read timeout bounds the wait between chunks
+        self.timeout = get_timeout(float(os.getenv("LLM_READ_TIMEOUT", "300")))
         
+    def warm_up(self):
+        """Ask Ollama to load the model into memory ahead of the first question."""
+        response = self.session.post(
+            f"{self.api_base}/api/generate",
+            json={"model": self.model, "keep_alive": self.keep_alive},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        logger.info(f"LLM model {self.model} loaded")
+    
     def generate_response(self, prompt, context, temperature=0.7):
-        """Generate a response from the LLM."""
+        """Generate a response from the LLM.
+
+        Ollama's load, prompt eval and generation timings are recorded with
+        metrics.record_llm.
+        """
         try:
             logger.info("Generating response from LLM")
             
@@ -25,18 +57,21 @@ class LLMInterface:
             full_prompt = self._format_prompt(prompt, context)
             
             # Make API call to Ollama
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_base}/api/generate",
                 json={
                     "model": self.model,
                     "prompt": full_prompt,
-                    "temperature": temperature,
+                    "options": {"temperature": temperature},
+                    "keep_alive": self.keep_alive,
                     "stream": False
-                }
+                },
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
                 result = response.json()
+                self._log_timings(metrics.record_llm(result))
                 return result.get("response", "Sorry, I couldn't generate a response.")
             else:
                 logger.error(f"Error from LLM API: {response.text}")
@@ -45,12 +80,82 @@ class LLMInterface:
             logger.error(f"Error calling LLM API: {e}")
             return "Sorry, there was an error communicating with the LLM."
     
+    def generate_response_stream(self, prompt, context, temperature=0.7):
+        """Generate a response from the LLM, yielding text chunks as they arrive.
+
+        Consumes Ollama's NDJSON stream from /api/generate; the timings in
+        its final chunk are recorded with metrics.record_llm. Failures, even
+        after some tokens were streamed, end the stream with one of the
+        ERROR_RESPONSES as a chunk of its own.
+        """
+        try:
+            logger.info("Streaming response from LLM")
+            
+            # Format the prompt with context
+            full_prompt = self._format_prompt(prompt, context)
+            
+            # Make streaming API call to Ollama
+            with self.session.post(
+                f"{self.api_base}/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": full_prompt,
+                    "options": {"temperature": temperature},
+                    "keep_alive": self.keep_alive,
+                    "stream": True
+                },
+                timeout=self.timeout,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"Error from LLM API: {response.text}")
+                    yield "Sorry, there was an error generating a response."
+                    return
+                
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        logger.error(f"Error from LLM API: {chunk['error']}")
+                        yield "Sorry, there was an error generating a response."
+                        return
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        self._log_timings(metrics.record_llm(chunk))
+                        break
+        except Exception as e:
+            logger.error(f"Error calling LLM API: {e}")
+            yield "Sorry, there was an error communicating with the LLM."
+    
+    def _log_timings(self, stats):
+        if stats:
+            logger.info(
+                f"LLM prompt eval {stats.get('prompt_tokens', '-')} tokens in {stats.get('prompt_eval_ms', '-')} ms, "
+                f"generated {stats.get('generated_tokens', '-')} tokens in {stats.get('eval_ms', '-')} ms"
+            )
+    
     def _format_prompt(self, prompt, context):
-        """Format the prompt with context for the LLM."""
-        return f"""You are an expert system logs analyzer. Your task is to analyze log data from a topup application and provide clear, accurate answers.
+        """Format the prompt with context for the LLM.
 
-Context (relevant log entries):
-{json.dumps(context, indent=2)}
+        context is either a PackedContext or a list of logs, which is packed
+        with the default ContextBuilder.
+        """
+        if not isinstance(context, PackedContext):
+            context = self.context_builder.build(context)
+        
+        summary = ""
+        if context.summary:
+            summary = f"""
+Summary (computed over all matching logs in the requested window, not just the entries below):
+{context.summary}
+"""
+        
+        return f"""You are an expert system logs analyzer. Your task is to analyze log data from a topup application and provide clear, accurate answers.
+{summary}
+Context (relevant log entries, one per line: timestamp level service transid | message; "(xN)" marks N identical entries):
+{context.text}
 
 User Question: {prompt}
 
@@ -0,0 +1,370 @@
+import os
+import json
+import shutil
+import logging
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+
+# Comparison operators supported in ``where`` clauses, as in Chroma
+OPERATORS = {
+    "$eq": lambda column, value: column == value,
+    "$ne": lambda column, value: column != value,
+    "$gt": lambda column, value: column > value,
+    "$gte": lambda column, value: column >= value,
+    "$lt": lambda column, value: column < value,
+    "$lte": lambda column, value: column <= value,
+}
+
+
+class ColumnStore:
+    """Columnar metadata for the rows of a LocalCollection.
+
+    Rows live in memory as one list per metadata key. Writes are appended to
+    a JSONL journal, which is folded into a JSON snapshot once it grows
+    larger than the snapshot, so both writes and reloads stay cheap.
+    """
+
+    def __init__(self, path):
+        self.snapshot_path = os.path.join(path, "columns.json")
+        self.journal_path = os.path.join(path, "journal.jsonl")
+        self.ids = []
+        self.documents = []
+        self.columns = {}
+        self.rows_by_id = {}
+        self._arrays = {}
+        self._journal_rows = 0
+        self._load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _load(self):
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                state = json.load(f)
+            self.ids = state["ids"]
+            self.documents = state["documents"]
+            self.columns = state["columns"]
+            self.rows_by_id = {current_id: row for row, current_id in enumerate(self.ids)}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from an interrupted write
+                        logger.warning(f"Skipping corrupt journal line in {self.journal_path}")
+                        continue
+                    self._apply(record)
+                    self._journal_rows += 1
+
+    def _apply(self, record):
+        row = record["row"]
+        if row == len(self.ids):
+            self.ids.append(record["id"])
+            self.documents.append(None)
+            for values in self.columns.values():
+                values.append(None)
+            self.rows_by_id[record["id"]] = row
+        if "document" in record:
+            self.documents[row] = record["document"]
+        if "metadata" in record:
+            for values in self.columns.values():
+                values[row] = None
+            for key, value in record["metadata"].items():
+                if key not in self.columns:
+                    self.columns[key] = [None] * len(self.ids)
+                self.columns[key][row] = value
+        self._arrays.clear()
+
+    def write(self, records):
+        """Apply and journal records of row, id and optionally document and metadata."""
+        if not records:
+            return
+        for record in records:
+            self._apply(record)
+        with open(self.journal_path, "a") as f:
+            f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self._journal_rows += len(records)
+        if self._journal_rows > max(len(self.ids), 1000):
+            self.compact()
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot."""
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "columns": self.columns}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+        open(self.journal_path, "w").close()
+        self._journal_rows = 0
+
+    def metadata(self, row):
+        return {key: values[row] for key, values in self.columns.items() if values[row] is not None}
+
+    def _array(self, key):
+        """Return a column as a float array (NaN for missing) or an object array."""
+        if key not in self._arrays:
+            values = self.columns.get(key, [None] * len(self.ids))
+            present = [v for v in values if v is not None]
+            if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+                array = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                array = np.empty(len(values), dtype=object)
+                array[:] = values
+            self._arrays[key] = array
+        return self._arrays[key]
+
+    def _compare(self, key, operator, value):
+        column = self._array(key)
+        if operator in ("$in", "$nin"):
+            values = set(value)
+            found = np.array([v in values for v in column], dtype=bool)
+            return found if operator == "$in" else ~found
+        if operator not in OPERATORS:
+            raise ValueError(f"Unsupported where operator: {operator}")
+        if column.dtype == object and operator not in ("$eq", "$ne"):
+            compare = OPERATORS[operator]
+            return np.array([v is not None and compare(v, value) for v in column], dtype=bool)
+        return np.asarray(OPERATORS[operator](column, value), dtype=bool)
+
+    def mask(self, where):
+        """Evaluate a Chroma-style ``where`` clause into a boolean row mask."""
+        result = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    result &= self.mask(clause)
+            elif key == "$or":
+                either = np.zeros(len(self.ids), dtype=bool)
+                for clause in condition:
+                    either |= self.mask(clause)
+                result &= either
+            elif isinstance(condition, dict):
+                for operator, value in condition.items():
+                    result &= self._compare(key, operator, value)
+            else:
+                result &= self._compare(key, "$eq", condition)
+        return result
+
+
+class LocalCollection:
+    """In-process vector collection with the subset of the Chroma API VectorStore uses.
+
+    Vectors are float32 rows in a memory-mapped file that doubles in
+    capacity as it fills; squared L2 norms are kept alongside for distance
+    computation. Queries filter rows with the ``where`` mask first and then
+    scan the remaining vectors in blocks, returning exact nearest neighbours
+    by squared L2 distance (Chroma's default space).
+    """
+
+    def __init__(self, name, path, metadata=None):
+        self.name = name
+        self.path = path
+        self.metadata = metadata or {}
+        self.block_size = int(os.getenv("LOCAL_INDEX_BLOCK_SIZE", "65536"))
+        self._lock = threading.RLock()
+
+        os.makedirs(path, exist_ok=True)
+        self._state_path = os.path.join(path, "state.json")
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self.dimension = None
+        self.capacity = 0
+        if os.path.exists(self._state_path):
+            with open(self._state_path) as f:
+                state = json.load(f)
+            self.dimension = state["dimension"]
+            self.capacity = state["capacity"]
+            self.metadata = state.get("metadata", self.metadata)
+        else:
+            self._save_state()
+        self.store = ColumnStore(path)
+        self._vectors = None
+        self._norms = np.zeros(0, dtype=np.float32)
+        if self.dimension and self.capacity:
+            self._open_vectors()
+
+    def _save_state(self):
+        tmp_path = f"{self._state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dimension": self.dimension, "capacity": self.capacity, "metadata": self.metadata}, f)
+        os.replace(tmp_path, self._state_path)
+
+    def _open_vectors(self):
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension))
+        rows = len(self.store)
+        self._norms = np.einsum("ij,ij->i", self._vectors[:rows], self._vectors[:rows]).astype(np.float32)
+
+    def _reserve(self, rows):
+        """Grow the memory-mapped vector file to hold at least rows vectors."""
+        if rows <= self.capacity:
+            return
+        capacity = max(1024, self.capacity)
+        while capacity < rows:
+            capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self.capacity = capacity
+        self._save_state()
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def count(self):
+        with self._lock:
+            return len(self.store)
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents")):
+        with self._lock:
+            if ids is not None:
+                rows = [self.store.rows_by_id[i] for i in ids if i in self.store.rows_by_id]
+            else:
+                rows = list(range(len(self.store)))
+            if where:
+                mask = self.store.mask(where)
+                rows = [row for row in rows if mask[row]]
+            result = {"ids": [self.store.ids[row] for row in rows]}
+            if "metadatas" in include:
+                result["metadatas"] = [self.store.metadata(row) for row in rows]
+            if "documents" in include:
+                result["documents"] = [self.store.documents[row] for row in rows]
+            return result
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        if embeddings is None:
+            raise ValueError("The local index needs precomputed embeddings")
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                self._save_state()
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dimension}")
+
+            records = []
+            rows = []
+            next_row = len(self.store)
+            for i, current_id in enumerate(ids):
+                row = self.store.rows_by_id.get(current_id)
+                if row is None:
+                    row = next_row
+                    next_row += 1
+                rows.append(row)
+                record = {"row": row, "id": current_id}
+                if documents is not None:
+                    record["document"] = documents[i]
+                if metadatas is not None:
+                    record["metadata"] = metadatas[i]
+                records.append(record)
+
+            # Vectors reach the file before the journal references them
+            self._reserve(next_row)
+            self._vectors[rows] = vectors
+            self._vectors.flush()
+            if len(self._norms) < next_row:
+                self._norms = np.concatenate([self._norms, np.zeros(next_row - len(self._norms), dtype=np.float32)])
+            self._norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+            self.store.write(records)
+
+    def update(self, ids, metadatas=None, documents=None):
+        with self._lock:
+            records = []
+            for i, current_id in enumerate(ids):
+                row = self.store.rows_by_id.get(current_id)
+                if row is None:
+                    continue
+                record = {"row": row, "id": current_id}
+                if metadatas is not None:
+                    record["metadata"] = metadatas[i]
+                if documents is not None:
+                    record["document"] = documents[i]
+                records.append(record)
+            self.store.write(records)
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None,
+              include=("metadatas", "documents", "distances")):
+        if query_embeddings is None:
+            raise ValueError("The local index needs precomputed query embeddings")
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        result = {"ids": [], "distances": [], "metadatas": [], "documents": []}
+        with self._lock:
+            total = len(self.store)
+            candidates = np.flatnonzero(self.store.mask(where)) if where else None
+            for query in queries:
+                distances, rows = self._search(query, n_results, total, candidates)
+                result["ids"].append([self.store.ids[row] for row in rows])
+                result["distances"].append([float(d) for d in distances])
+                result["metadatas"].append([self.store.metadata(row) for row in rows])
+                result["documents"].append([self.store.documents[row] for row in rows])
+        return result
+
+    def _search(self, query, n_results, total, candidates=None):
+        """Exact kNN over all rows (or the candidate rows) in blocks."""
+        if total == 0 or n_results <= 0 or (candidates is not None and len(candidates) == 0):
+            return [], []
+        query_norm = float(np.dot(query, query))
+        best_distances = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        size = total if candidates is None else len(candidates)
+        for start in range(0, size, self.block_size):
+            if candidates is None:
+                rows = np.arange(start, min(start + self.block_size, size))
+                block = self._vectors[start:start + len(rows)]
+            else:
+                rows = candidates[start:start + self.block_size]
+                block = self._vectors[rows]
+            distances = self._norms[rows] - 2.0 * (block @ query) + query_norm
+            if len(distances) > n_results:
+                top = np.argpartition(distances, n_results - 1)[:n_results]
+                distances, rows = distances[top], rows[top]
+            best_distances = np.concatenate([best_distances, distances])
+            best_rows = np.concatenate([best_rows, rows])
+        order = np.argsort(best_distances, kind="stable")[:n_results]
+        return np.maximum(best_distances[order], 0.0), best_rows[order]
+
+
+class LocalIndexClient:
+    """Chroma-client-like factory for LocalCollection directories under LOCAL_INDEX_PATH."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("LOCAL_INDEX_PATH", os.path.join(DATA_DIR, "vector_index"))
+        os.makedirs(self.path, exist_ok=True)
+        self._collections = {}
+        self._lock = threading.Lock()
+        logger.info(f"Using local vector index at {self.path}")
+
+    def list_collections(self):
+        with self._lock:
+            names = [
+                name for name in sorted(os.listdir(self.path))
+                if os.path.isdir(os.path.join(self.path, name))
+            ]
+        return [self.get_collection(name) for name in names]
+
+    def get_collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                if not os.path.isdir(os.path.join(self.path, name)):
+                    raise ValueError(f"Collection {name} does not exist")
+                self._collections[name] = LocalCollection(name, os.path.join(self.path, name))
+            return self._collections[name]
+
+    def create_collection(self, name, metadata=None, embedding_function=None):
+        with self._lock:
+            if os.path.isdir(os.path.join(self.path, name)):
+                raise ValueError(f"Collection {name} already exists")
+            self._collections[name] = LocalCollection(name, os.path.join(self.path, name), metadata)
+            return self._collections[name]
+
+    def delete_collection(self, name):
+        with self._lock:
+            self._collections.pop(name, None)
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
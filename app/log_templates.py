@@ -0,0 +1,236 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+import threading
+from dotenv import load_dotenv
+from vector_store import log_id
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+
+WILDCARD = "<*>"
+
+# Variable parts masked before clustering
+MASK_PATTERNS = [
+    re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"),
+    re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),
+    re.compile(r"\b0x[0-9a-fA-F]+\b"),
+    re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?\b"),
+    re.compile(r"(?<![A-Za-z])[-+]?\d+(?:[.,]\d+)*(?![A-Za-z])"),
+]
+
+# Fields holding the free-text part of a log, in order of preference
+MESSAGE_FIELDS = ["message", "log", "details"]
+
+
+def log_message(log):
+    """Return the free-text message of a log."""
+    for field in MESSAGE_FIELDS:
+        if log.get(field):
+            return str(log[field])
+    return ""
+
+
+def tokenize(message):
+    """Mask variable parts of a message and split it into tokens."""
+    for pattern in MASK_PATTERNS:
+        message = pattern.sub(WILDCARD, message)
+    return message.split()
+
+
+class LogTemplate:
+    """A cluster of log messages sharing one template."""
+
+    def __init__(self, template_id, tokens, count=0, first_seen=None, last_seen=None):
+        self.template_id = template_id
+        self.tokens = tokens
+        self.count = count
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+
+    @property
+    def text(self):
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens):
+        """Fraction of positions where the template matches the tokens exactly."""
+        if not tokens:
+            return 1.0
+        same = sum(1 for a, b in zip(self.tokens, tokens) if a == b and a != WILDCARD)
+        return same / len(tokens)
+
+    def merge(self, tokens):
+        """Generalize the template to cover tokens. Returns True if it changed."""
+        merged = [a if a == b else WILDCARD for a, b in zip(self.tokens, tokens)]
+        changed = merged != self.tokens
+        self.tokens = merged
+        return changed
+
+    def to_dict(self):
+        return {
+            "template_id": self.template_id,
+            "template": self.text,
+            "count": self.count,
+            "first_seen": self.first_seen or "",
+            "last_seen": self.last_seen or ""
+        }
+
+
+class TemplateStore:
+    """SQLite store for templates and a bounded list of member logs per template."""
+
+    def __init__(self, path=None, max_members=None):
+        self.path = path or os.getenv(
+            "TEMPLATE_STORE_PATH", os.path.join(DATA_DIR, "log_templates.sqlite")
+        )
+        self.max_members = max_members or int(os.getenv("TEMPLATE_MAX_MEMBERS", "50"))
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            "template_id INTEGER PRIMARY KEY, template TEXT NOT NULL, count INTEGER NOT NULL, "
+            "first_seen TEXT, last_seen TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS members ("
+            "template_id INTEGER NOT NULL, log_id TEXT NOT NULL, timestamp TEXT, log_json TEXT NOT NULL, "
+            "PRIMARY KEY (template_id, log_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_members_time ON members (template_id, timestamp)")
+        self._conn.commit()
+
+    def load_templates(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT template_id, template, count, first_seen, last_seen FROM templates"
+            ).fetchall()
+        return [LogTemplate(row[0], row[1].split(), row[2], row[3], row[4]) for row in rows]
+
+    def save(self, templates, members):
+        """Persist templates and append (template_id, log) members, trimming old ones."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO templates (template_id, template, count, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(t.template_id, t.text, t.count, t.first_seen, t.last_seen) for t in templates]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO members (template_id, log_id, timestamp, log_json) VALUES (?, ?, ?, ?)",
+                [
+                    (template_id, log_id(log), str(log.get("@timestamp", "")), json.dumps(log, default=str))
+                    for template_id, log in members
+                ]
+            )
+            for template_id in {template_id for template_id, _ in members}:
+                self._conn.execute(
+                    "DELETE FROM members WHERE template_id = ? AND log_id NOT IN "
+                    "(SELECT log_id FROM members WHERE template_id = ? ORDER BY timestamp DESC LIMIT ?)",
+                    (template_id, template_id, self.max_members)
+                )
+            self._conn.commit()
+
+    def get_members(self, template_id, limit=None):
+        """Return the most recent member logs of a template."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT log_json FROM members WHERE template_id = ? ORDER BY timestamp DESC LIMIT ?",
+                (template_id, limit or self.max_members)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class TemplateMiner:
+    """Online Drain-style log template miner.
+
+    Messages are masked, tokenized and routed through a fixed-depth prefix
+    tree (token count, then the first TEMPLATE_TREE_DEPTH tokens) to a leaf
+    of candidate templates. A message joins the most similar template if
+    the similarity reaches TEMPLATE_SIM_THRESHOLD, generalizing differing
+    tokens to a wildcard; otherwise it starts a new template.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or TemplateStore()
+        self.sim_threshold = float(os.getenv("TEMPLATE_SIM_THRESHOLD", "0.5"))
+        self.depth = int(os.getenv("TEMPLATE_TREE_DEPTH", "2"))
+        self._lock = threading.Lock()
+        self._tree = {}
+        self._next_id = 1
+
+        for template in self.store.load_templates():
+            self._leaf(template.tokens).append(template)
+            self._next_id = max(self._next_id, template.template_id + 1)
+        logger.info(f"Loaded {self._next_id - 1} log templates")
+
+    def _leaf(self, tokens):
+        prefix = tuple(
+            WILDCARD if any(c.isdigit() for c in token) else token
+            for token in tokens[:self.depth]
+        )
+        return self._tree.setdefault((len(tokens), prefix), [])
+
+    def match(self, tokens):
+        """Return the best matching template for tokens, or None."""
+        best, best_sim = None, -1.0
+        for template in self._leaf(tokens):
+            sim = template.similarity(tokens)
+            if sim > best_sim:
+                best, best_sim = template, sim
+        if best is not None and best_sim >= self.sim_threshold:
+            return best
+        return None
+
+    def add_logs(self, logs):
+        """Cluster logs into templates and persist them.
+
+        Returns the list of templates touched by this batch as dicts, with
+        a ``text_changed`` flag telling whether the template text needs to
+        be re-embedded.
+        """
+        touched = {}
+        text_changed = set()
+        members = []
+
+        with self._lock:
+            for log in logs:
+                tokens = tokenize(log_message(log))
+                if not tokens:
+                    continue
+
+                template = self.match(tokens)
+                if template is None:
+                    template = LogTemplate(self._next_id, tokens)
+                    self._next_id += 1
+                    self._leaf(tokens).append(template)
+                    text_changed.add(template.template_id)
+                elif template.merge(tokens):
+                    text_changed.add(template.template_id)
+
+                template.count += 1
+                timestamp = log.get("@timestamp")
+                if timestamp:
+                    timestamp = str(timestamp)
+                    if not template.first_seen or timestamp < template.first_seen:
+                        template.first_seen = timestamp
+                    if not template.last_seen or timestamp > template.last_seen:
+                        template.last_seen = timestamp
+
+                touched[template.template_id] = template
+                members.append((template.template_id, log))
+
+            self.store.save(list(touched.values()), members)
+
+        logger.info(f"Mined {len(logs)} logs into {len(touched)} templates ({len(text_changed)} new or changed)")
+        return [
+            dict(template.to_dict(), text_changed=template.template_id in text_changed)
+            for template in touched.values()
+        ]
@@ -4,6 +4,7 @@ import threading
 import logging
 from dotenv import load_dotenv
 from rag_pipeline import RAGPipeline
+import metrics
 
 load_dotenv()
 
@@ -20,37 +21,67 @@ def refresh_logs_periodically():
     refresh_interval = int(os.getenv("REFRESH_INTERVAL", "300"))  # Default: 5 minutes
     
     while True:
+        # Sleep until next refresh
+        logger.info(f"Next refresh in {refresh_interval} seconds")
+        time.sleep(refresh_interval)
+        
         logger.info("Starting periodic log refresh")
         try:
             logs_count = rag_pipeline.refresh_logs()
             logger.info(f"Refreshed {logs_count} logs")
         except Exception as e:
             logger.error(f"Error refreshing logs: {e}")
-        
-        # Sleep until next refresh
-        logger.info(f"Next refresh in {refresh_interval} seconds")
-        time.sleep(refresh_interval)
 
-def init_application():
-    """Initialize the application."""
+def retry_warm_up():
+    """Retry failed startup phases with exponential backoff until all are ready."""
+    delay = float(os.getenv("WARM_UP_RETRY_SECONDS", "10"))
+    max_delay = float(os.getenv("WARM_UP_RETRY_MAX_SECONDS", "300"))
+    
+    while rag_pipeline.warm_up_pending():
+        logger.info(f"Retrying failed startup phases in {delay:.0f} seconds")
+        time.sleep(delay)
+        rag_pipeline.warm_up()
+        delay = min(delay * 2, max_delay)
+    logger.info("All startup phases ready")
+
+def warm_up_in_background():
+    """Bring up the pipeline components, load initial logs, then keep refreshing."""
     global rag_pipeline
     
-    logger.info("Initializing RAG pipeline")
-    rag_pipeline = RAGPipeline()
+    rag_pipeline.warm_up()
+    if rag_pipeline.warm_up_pending():
+        # e.g. llm-server still starting when the app comes up
+        threading.Thread(target=retry_warm_up, daemon=True).start()
+    
+    if not rag_pipeline.ingest_in_process:
+        logger.info("Ingestion runs in the ingest worker, this process only serves queries")
+        return
     
     # Initial log loading
     logger.info("Loading initial logs")
     try:
-        logs_count = rag_pipeline.refresh_logs()
+        with rag_pipeline.startup.phase("initial_ingest"):
+            logs_count = rag_pipeline.refresh_logs()
         logger.info(f"Loaded {logs_count} initial logs")
     except Exception as e:
         logger.error(f"Error loading initial logs: {e}")
+    rag_pipeline.startup.log_report()
+    
+    refresh_logs_periodically()
+
+def init_application():
+    """Initialize the application without blocking on external services."""
+    global rag_pipeline
     
-    # Start background refresh thread
-    refresh_thread = threading.Thread(target=refresh_logs_periodically, daemon=True)
-    refresh_thread.start()
+    logger.info("Initializing RAG pipeline")
+    metrics.start_server()
+    rag_pipeline = RAGPipeline(lazy=True)
     
-    logger.info("Application initialization complete")
+    # Warm up components and start the refresh loop in the background
+    warm_up_thread = threading.Thread(target=warm_up_in_background, daemon=True)
+    warm_up_thread.start()
+    
+    logger.info("Application initialization complete, warming up in background")
     return rag_pipeline
 
 # Get or initialize RAG pipeline
@@ -63,3 +94,6 @@ def get_rag_pipeline():
 if __name__ == "__main__":
     # This will be executed when running this file directly (not through Streamlit)
     init_application()
+    # Keep the process alive for the background warm-up and refresh thread
+    while True:
+        time.sleep(3600)
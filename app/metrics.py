@@ -0,0 +1,297 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Seconds; spans range from sub-millisecond cache lookups to minutes of CPU generation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, as Prometheus expects."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        labelnames = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(labelnames, key + (_format_value(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """The process-wide set of metrics rendered by the /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Time spent in one stage of the query or ingest path.", ("path", "stage")
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "rag_request_seconds", "End-to-end time of a query or ingest cycle.", ("path", "type")
+)
+REQUESTS = REGISTRY.counter(
+    "rag_requests_total", "Queries and ingest cycles handled.", ("path", "type")
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "rag_llm_seconds", "Ollama time per generation, split into load, prompt eval and eval.", ("phase",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "rag_llm_tokens_total", "Tokens processed by Ollama.", ("kind",)
+)
+INGESTED_LOGS = REGISTRY.counter(
+    "rag_ingested_logs_total", "Logs written to the vector store."
+)
+
+# Ollama duration fields (nanoseconds) -> phase label
+LLM_PHASES = {
+    "load_duration": "load",
+    "prompt_eval_duration": "prompt_eval",
+    "eval_duration": "eval",
+    "total_duration": "total",
+}
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+class Trace:
+    """Timings of one query or ingest cycle, collected from nested spans.
+
+    Spans with the same name are summed, so a stage that runs once per
+    partition or page reports its total time.
+    """
+
+    def __init__(self, path, kind=None):
+        self.path = path
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.stages = {}
+        self.llm = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def timings(self):
+        """Return the breakdown in milliseconds, stages in the order they first ran."""
+        total = self.seconds if self.seconds is not None else time.perf_counter() - self.start
+        with self._lock:
+            return {
+                "total_ms": round(total * 1000, 1),
+                "stages": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+                "llm": dict(self.llm),
+            }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(path, kind=None):
+    """Collect the spans of one request into a Trace and record its total time.
+
+    kind (e.g. the query type) can be set on the trace once it is known.
+    """
+    current = Trace(path, kind)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - current.start
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # A streaming generator closed from another context
+            pass
+        REQUEST_SECONDS.observe(current.seconds, path=path, type=current.kind or "")
+        REQUESTS.inc(path=path, type=current.kind or "")
+
+
+@contextmanager
+def span(stage):
+    """Time a stage, adding it to the current trace and the stage histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        current = _current_trace.get()
+        if current is not None:
+            current.add(stage, seconds)
+        STAGE_SECONDS.observe(seconds, path=current.path if current else "", stage=stage)
+
+
+def timed(stage, fn):
+    """Wrap fn so every call runs inside span(stage)."""
+    def wrapper(*args, **kwargs):
+        with span(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def record_llm(response):
+    """Record the timing fields of a final Ollama /api/generate response."""
+    stats = {}
+    for field, phase in LLM_PHASES.items():
+        if response.get(field) is not None:
+            seconds = response[field] / 1e9
+            LLM_SECONDS.observe(seconds, phase=phase)
+            stats[f"{phase}_ms"] = round(seconds * 1000, 1)
+    for field, kind in (("prompt_eval_count", "prompt"), ("eval_count", "generated")):
+        if response.get(field) is not None:
+            LLM_TOKENS.inc(response[field], kind=kind)
+            stats[f"{kind}_tokens"] = response[field]
+    if response.get("eval_count") and response.get("eval_duration"):
+        stats["tokens_per_sec"] = round(response["eval_count"] / (response["eval_duration"] / 1e9), 1)
+
+    current = _current_trace.get()
+    if current is not None:
+        with current._lock:
+            current.llm.update(stats)
+    return stats
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_server(port=None):
+    """Serve /metrics on METRICS_PORT from a daemon thread, once per process.
+
+    Returns the server, or None when disabled (port 0) or the port is taken.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        port = int(port if port is not None else os.getenv("METRICS_PORT", "9100"))
+        if not port:
+            return None
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError as e:
+            logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on port {port}")
+        return _server
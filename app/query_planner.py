@@ -0,0 +1,300 @@
+import os
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Duration units in Vietnamese and English
+UNITS = {
+    "phút": "minutes", "minute": "minutes", "minutes": "minutes", "min": "minutes", "mins": "minutes",
+    "giờ": "hours", "tiếng": "hours", "hour": "hours", "hours": "hours", "hr": "hours", "hrs": "hours", "h": "hours",
+    "ngày": "days", "day": "days", "days": "days",
+    "tuần": "weeks", "week": "weeks", "weeks": "weeks",
+}
+UNIT_PATTERN = "|".join(sorted((re.escape(u) for u in UNITS), key=len, reverse=True))
+
+# "trong 6 giờ qua", "last 6 hours", "past 30 minutes", "2 giờ qua", "3 days ago"
+RELATIVE_PATTERNS = [
+    re.compile(rf"\b(?:trong|last|past|within|the last|the past)\s+(\d+)\s*({UNIT_PATTERN})\b(?:\s*(?:qua|vừa qua|gần đây|trước))?", re.IGNORECASE),
+    re.compile(rf"\b(\d+)\s*({UNIT_PATTERN})\s+(?:qua|vừa qua|gần đây|trước|ago)\b", re.IGNORECASE),
+]
+# "last hour", "giờ qua" without a number
+SINGLE_UNIT_PATTERN = re.compile(rf"\b(?:last|past|the last|the past)\s+({UNIT_PATTERN})\b", re.IGNORECASE)
+
+TODAY_PATTERN = re.compile(r"\b(?:hôm nay|today|ngày hôm nay)\b", re.IGNORECASE)
+YESTERDAY_PATTERN = re.compile(r"\b(?:hôm qua|yesterday)\b", re.IGNORECASE)
+
+# "from 10:00 to 11:30", "từ 10:00 đến 11:30", "10h-11h"
+CLOCK = r"(\d{1,2})(?:[:h](\d{2})?)"
+CLOCK_RANGE_PATTERN = re.compile(
+    rf"(?:\bfrom|\btừ|\bbetween)?\s*{CLOCK}\s*(?:to|until|đến|tới|and|-)\s*{CLOCK}", re.IGNORECASE
+)
+
+# ISO dates (2024-05-05, optionally with time) and Vietnamese dd/mm/yyyy
+DATE = r"(\d{4}-\d{2}-\d{2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?|\d{1,2}/\d{1,2}/\d{4})"
+DATE_RANGE_PATTERN = re.compile(rf"(?:\bfrom|\btừ|\bbetween)?\s*{DATE}\s*(?:to|until|đến|tới|and|-)\s*{DATE}", re.IGNORECASE)
+DATE_PATTERN = re.compile(rf"(?:\bon|\bngày)?\s*{DATE}", re.IGNORECASE)
+
+LEVELS = {
+    "error": "ERROR", "errors": "ERROR", "lỗi": "ERROR",
+    "warn": "WARN", "warning": "WARN", "warnings": "WARN", "cảnh báo": "WARN",
+    "info": "INFO",
+    "debug": "DEBUG",
+}
+LEVEL_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(k) for k in LEVELS), key=len, reverse=True)) + r")\b", re.IGNORECASE
+)
+
+# "payment service", "service payment", "module payment", "dịch vụ payment"
+SERVICE_PATTERNS = [
+    re.compile(r"\b(?:service|module|dịch vụ)\s+([A-Za-z][\w-]*)", re.IGNORECASE),
+    re.compile(r"\b([A-Za-z][\w-]*)\s+(?:service|module)\b", re.IGNORECASE),
+]
+# Words that follow or precede "service"/"module" in ordinary questions without naming one;
+# only consulted when QUERY_SERVICES does not list the known services
+NOT_SERVICES = {
+    "the", "from", "of", "in", "a", "an", "this", "that", "these", "those", "each", "every", "all", "any",
+    "which", "what", "who", "whose", "why", "how", "when", "where", "log", "logs", "my", "our", "your",
+    "its", "their", "some", "one", "same", "other", "another", "per", "by", "for", "to", "on", "at",
+    "is", "was", "are", "were", "be", "been", "being", "has", "have", "had", "do", "does", "did",
+    "can", "could", "will", "would", "should", "may", "might", "not", "no", "and", "or", "but", "with",
+    "fail", "fails", "failed", "failing", "failure", "down", "up", "crash", "crashed", "crashing",
+    "error", "errors", "slow", "timeout", "timed", "stopped", "restart", "restarted", "unavailable",
+    "health", "status", "name", "names", "call", "calls", "level", "layer", "side", "mesh", "account",
+    "nào", "gì", "này", "đó", "kia", "bị", "đang", "đã", "có", "không", "là", "của", "cho",
+}
+
+# Words that carry no search meaning once filters are extracted
+STOPWORDS = {
+    "show", "display", "list", "get", "find", "give", "me", "all", "the", "a", "an", "of", "in", "on", "for",
+    "from", "to", "and", "logs", "log", "entries", "please", "what", "any", "service", "module",
+    "hiển", "thị", "xem", "tìm", "cho", "tôi", "các", "những", "của", "trong", "từ", "đến", "log", "giúp",
+    "hãy", "có", "nào", "không", "dịch", "vụ", "hệ", "thống",
+}
+
+
+class QueryPlan:
+    """Structured filters extracted from a natural-language query."""
+
+    def __init__(self, query, text, start=None, end=None, service=None, level=None, time_label=None):
+        self.query = query
+        self.text = text
+        self.start = start
+        self.end = end
+        self.service = service
+        self.level = level
+        self.time_label = time_label
+
+    @property
+    def has_filters(self):
+        return bool(self.start or self.end or self.service or self.level)
+
+    @property
+    def has_text(self):
+        """True if words beyond the extracted filters remain to search for."""
+        words = re.findall(r"\w+", self.text.lower())
+        return any(word not in STOPWORDS and not word.isdigit() for word in words)
+
+    def to_es_filters(self):
+        """Compile the plan into Elasticsearch filter clauses."""
+        filters = []
+        if self.start or self.end:
+            time_range = {}
+            if self.start:
+                time_range["gte"] = self.start.isoformat()
+            if self.end:
+                time_range["lte"] = self.end.isoformat()
+            filters.append({"range": {"@timestamp": time_range}})
+        if self.service:
+            filters.append({"term": {os.getenv("ES_SERVICE_FIELD", "service.keyword"): self.service}})
+        if self.level:
+            filters.append({"terms": {os.getenv("ES_LEVEL_FIELD", "level.keyword"): [self.level, self.level.lower()]}})
+        return filters
+
+    def to_vector_filters(self):
+        """Compile the plan into VectorStore.query_similar filters."""
+        filters = {}
+        if self.start:
+            filters["start_ms"] = int(self.start.timestamp() * 1000)
+        if self.end:
+            filters["end_ms"] = int(self.end.timestamp() * 1000)
+        if self.service:
+            filters["service"] = self.service
+        if self.level:
+            filters["level"] = self.level
+        return filters or None
+
+    def matches(self, log):
+        """Check a log against the plan's filters."""
+        if self.start or self.end:
+            timestamp = parse_timestamp(log.get("@timestamp"))
+            if timestamp is None:
+                return False
+            if self.start and timestamp < self.start:
+                return False
+            if self.end and timestamp > self.end:
+                return False
+        if self.service and str(log.get("service", "")).lower() != self.service.lower():
+            return False
+        if self.level and str(log.get("level", "")).upper() != self.level:
+            return False
+        return True
+
+    def cache_key(self):
+        """A stable key for the filters, using the time expression rather than absolute times."""
+        return (self.time_label, self.service, self.level)
+
+    def describe(self):
+        parts = []
+        if self.start or self.end:
+            start = self.start.strftime("%Y-%m-%d %H:%M") if self.start else "…"
+            end = self.end.strftime("%Y-%m-%d %H:%M") if self.end else "now"
+            parts.append(f"time {start} → {end}")
+        if self.service:
+            parts.append(f"service={self.service}")
+        if self.level:
+            parts.append(f"level={self.level}")
+        return ", ".join(parts)
+
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 timestamp into an aware datetime (naive means UTC), or None."""
+    if not value:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+class QueryPlanner:
+    """Parse time ranges, service and level filters out of queries.
+
+    Relative ("trong 6 giờ qua", "last 30 minutes", "hôm nay") and absolute
+    ("from 10:00 to 11:30", "2024-05-05", "05/05/2024") expressions are
+    resolved in QUERY_TIMEZONE (default: the server's local zone). A word
+    next to "service"/"module" is taken as a service name only if it is in
+    QUERY_SERVICES, or, when that is empty, not a common word.
+    """
+
+    def __init__(self):
+        # Comma-separated known service names; when set, only these are recognized
+        self.services = {
+            name.strip().lower() for name in os.getenv("QUERY_SERVICES", "").split(",") if name.strip()
+        }
+        self.timezone = None
+        timezone_name = os.getenv("QUERY_TIMEZONE")
+        if timezone_name:
+            try:
+                from zoneinfo import ZoneInfo
+                self.timezone = ZoneInfo(timezone_name)
+            except Exception as e:
+                logger.warning(f"Unknown QUERY_TIMEZONE {timezone_name}: {e}")
+
+    def _now(self):
+        if self.timezone:
+            return datetime.now(self.timezone)
+        return datetime.now().astimezone()
+
+    def _parse_date(self, value, now):
+        """Parse an ISO or dd/mm/yyyy date (optionally with time) in the query timezone."""
+        if "/" in value:
+            day, month, year = (int(x) for x in value.split("/"))
+            parsed = datetime(year, month, day)
+        else:
+            parsed = datetime.fromisoformat(value.replace(" ", "T"))
+        return parsed.replace(tzinfo=now.tzinfo), len(value) > 10
+
+    def _parse_time(self, query, now):
+        """Return (start, end, label, matched span) for the first time expression found."""
+        for pattern in RELATIVE_PATTERNS:
+            match = pattern.search(query)
+            if match:
+                amount, unit = int(match.group(1)), UNITS[match.group(2).lower()]
+                return now - timedelta(**{unit: amount}), None, f"last {amount} {unit}", match.span()
+
+        match = SINGLE_UNIT_PATTERN.search(query)
+        if match:
+            unit = UNITS[match.group(1).lower()]
+            return now - timedelta(**{unit: 1}), None, f"last 1 {unit}", match.span()
+
+        match = DATE_RANGE_PATTERN.search(query)
+        if match:
+            start, _ = self._parse_date(match.group(1), now)
+            end, has_time = self._parse_date(match.group(2), now)
+            if not has_time:
+                end += timedelta(days=1)
+            return start, end, f"{match.group(1)}..{match.group(2)}", match.span()
+
+        match = CLOCK_RANGE_PATTERN.search(query)
+        if match and int(match.group(1)) < 24 and int(match.group(3)) < 24:
+            start = now.replace(hour=int(match.group(1)), minute=int(match.group(2) or 0), second=0, microsecond=0)
+            end = now.replace(hour=int(match.group(3)), minute=int(match.group(4) or 0), second=0, microsecond=0)
+            if start > end:
+                start -= timedelta(days=1)
+            elif start > now:
+                start -= timedelta(days=1)
+                end -= timedelta(days=1)
+            return start, end, f"{start.isoformat()}..{end.isoformat()}", match.span()
+
+        match = DATE_PATTERN.search(query)
+        if match:
+            start, has_time = self._parse_date(match.group(1), now)
+            end = None if has_time else start + timedelta(days=1)
+            return start, end, match.group(1), match.span()
+
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        match = TODAY_PATTERN.search(query)
+        if match:
+            return midnight, None, "today", match.span()
+        match = YESTERDAY_PATTERN.search(query)
+        if match:
+            return midnight - timedelta(days=1), midnight, "yesterday", match.span()
+
+        return None, None, None, None
+
+    def _is_service(self, word):
+        word = word.lower()
+        if self.services:
+            return word in self.services
+        return word not in NOT_SERVICES and word not in STOPWORDS and word not in LEVELS
+
+    def plan(self, query):
+        """Build a QueryPlan for a query."""
+        now = self._now()
+        text = query
+
+        try:
+            start, end, time_label, span = self._parse_time(query, now)
+        except (ValueError, OverflowError) as e:
+            logger.warning(f"Could not parse time expression in query: {e}")
+            start, end, time_label, span = None, None, None, None
+        if span:
+            text = text[:span[0]] + " " + text[span[1]:]
+
+        level = None
+        match = LEVEL_PATTERN.search(text)
+        if match:
+            level = LEVELS[match.group(1).lower()]
+            text = text[:match.start()] + " " + text[match.end():]
+
+        service = None
+        for pattern in SERVICE_PATTERNS:
+            match = next((m for m in pattern.finditer(text) if self._is_service(m.group(1))), None)
+            if match:
+                service = match.group(1).lower()
+                text = text[:match.start()] + " " + text[match.end():]
+                break
+
+        plan = QueryPlan(query, re.sub(r"\s+", " ", text).strip(), start, end, service, level, time_label)
+        if plan.has_filters:
+            logger.info(f"Query plan: {plan.describe()}; text: '{plan.text}'")
+        return plan
@@ -3,9 +3,25 @@ import os
 from dotenv import load_dotenv
 from elasticsearch_connector import ElasticsearchConnector
 from vector_store import VectorStore
-from llm_interface import LLMInterface
+from llm_interface import LLMInterface, is_error_response
+from ingest_checkpoint import IngestCheckpoint
+from log_templates import TemplateMiner
+from retrieval import HybridRetriever
+from fanout import FanOut
+from context_builder import ContextBuilder
+from answer_cache import AnswerCache
+from embeddings import EmbeddingEngine, EmbeddingError
+from startup import StartupTracker
+from query_planner import QueryPlanner
+from transaction_index import TransactionIndex
+from error_analytics import ErrorAnalytics
+from reranker import Reranker
+import metrics
+from concurrent.futures import ThreadPoolExecutor
 import json
 import re
+import time
+import threading
 
 load_dotenv()
 
@@ -13,22 +29,191 @@ logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 
 class RAGPipeline:
-    def __init__(self):
-        self.es_connector = ElasticsearchConnector()
-        self.vector_store = VectorStore()
+    def __init__(self, lazy=False):
+        """Create the pipeline.
+
+        With lazy=True only cheap local components are built; Elasticsearch,
+        the embedding model, ChromaDB and the LLM are brought up by warm_up(),
+        typically from a background thread. Until then queries run in a
+        degraded mode using whatever is ready.
+        """
+        self.startup = StartupTracker(["elasticsearch", "embedding_model", "vector_store", "llm"])
+        self.es_connector = None
+        self.embedding_engine = None
+        self.vector_store = None
+        self.template_miner = None
+        if os.getenv("TEMPLATE_MINING", "false").lower() == "true":
+            self.template_miner = TemplateMiner()
         self.llm = LLMInterface()
+        self.fanout = FanOut()
+        self.context_builder = ContextBuilder()
+        self.planner = QueryPlanner()
+        self.reranker = Reranker()
+        self.retriever = HybridRetriever(None, None, self.fanout, self.reranker)
+        self.error_analytics = None
+        if os.getenv("ERROR_ANALYTICS", "true").lower() == "true":
+            self.error_analytics = ErrorAnalytics(None)
+        self.answer_cache = AnswerCache(self._embed_query)
+        self.transaction_index = TransactionIndex()
+        self.checkpoint = IngestCheckpoint()
+        self.ingest_batch_size = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+        # False when a separate ingest worker process owns ingestion
+        self.ingest_in_process = os.getenv("INGEST_IN_PROCESS", "true").lower() == "true"
+        self._checkpoint_mtime = None
+        self._warm_up_lock = threading.Lock()
         
+        if not lazy:
+            self.warm_up()
+    
+    def warm_up(self, include_llm=True):
+        """Bring up all components, running independent phases concurrently.
+
+        Elasticsearch, the LLM model load and the embedding model + ChromaDB
+        chain start in parallel; each component becomes usable as soon as its
+        own phase is ready. Ingest-only processes pass include_llm=False.
+        Calling it again only retries the phases that are not ready, without
+        rebuilding the components that are.
+        """
+        with self._warm_up_lock:
+            with ThreadPoolExecutor(max_workers=3, thread_name_prefix="warmup") as pool:
+                futures = []
+                if not self.startup.is_ready("elasticsearch"):
+                    futures.append(pool.submit(self._warm_up_elasticsearch))
+                if not self.startup.is_ready("vector_store"):
+                    futures.append(pool.submit(self._warm_up_vector_store))
+                if include_llm and not self.startup.is_ready("llm"):
+                    futures.append(pool.submit(self._warm_up_llm))
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception:
+                        # Already recorded by the startup tracker
+                        pass
+            self.startup.log_report()
+    
+    def warm_up_pending(self, include_llm=True):
+        """Return True if a warm-up phase still has to succeed."""
+        phases = ["elasticsearch", "embedding_model", "vector_store"] + (["llm"] if include_llm else [])
+        return not all(self.startup.is_ready(name) for name in phases)
+    
+    def _warm_up_elasticsearch(self):
+        with self.startup.phase("elasticsearch"):
+            es_connector = ElasticsearchConnector()
+            if es_connector.client is None:
+                raise RuntimeError("Elasticsearch is not reachable")
+            # Only publish a connected client, so a None check means "not ready"
+            self.es_connector = es_connector
+            self.retriever.es_connector = es_connector
+            if self.error_analytics:
+                self.error_analytics.es_connector = es_connector
+    
+    def _warm_up_vector_store(self):
+        if not self.startup.is_ready("embedding_model"):
+            with self.startup.phase("embedding_model"):
+                embedding_engine = EmbeddingEngine()
+                if not embedding_engine.available:
+                    raise RuntimeError("Embedding model could not be loaded")
+                self.embedding_engine = embedding_engine
+                self.reranker.load()
+        with self.startup.phase("vector_store"):
+            vector_store = VectorStore(
+                template_store=self.template_miner.store if self.template_miner else None,
+                embedding_engine=self.embedding_engine
+            )
+            if vector_store.client is None:
+                raise RuntimeError("ChromaDB is not reachable")
+            self.vector_store = vector_store
+            self.retriever.vector_store = vector_store
+    
+    def _warm_up_llm(self):
+        with self.startup.phase("llm"):
+            self.llm.warm_up()
+    
+    def _embed_query(self, query):
+        """Embed a query for the answer cache, or None if the model is not loaded yet."""
+        if self.embedding_engine is None:
+            return None
+        try:
+            return self.embedding_engine.encode([query])[0]
+        except EmbeddingError:
+            return None
+    
     def refresh_logs(self, hours_back=24):
-        """Refresh logs in the vector store."""
+        """Ingest logs newer than the checkpoint into the vector store.
+
+        On the first run (no checkpoint) ingestion starts hours_back ago. Logs
+        are streamed from Elasticsearch in pages of INGEST_BATCH_SIZE; each page
+        is embedded and the checkpoint is saved after it, so a restart resumes
+        where the last cycle stopped. Does nothing when INGEST_IN_PROCESS is
+        false and a separate ingest worker owns ingestion.
+        """
         from datetime import datetime, timedelta
         
-        end_time = datetime.now().isoformat()
-        start_time = (datetime.now() - timedelta(hours=hours_back)).isoformat()
+        if not self.ingest_in_process:
+            # The ingest worker owns the checkpoint and retention
+            logger.warning("Skipping log refresh: ingestion runs in the ingest worker")
+            return 0
+        
+        if self.es_connector is None or self.vector_store is None:
+            logger.warning("Skipping log refresh: Elasticsearch or vector store not ready yet")
+            return 0
         
-        logs = self.es_connector.get_logs_by_time_range(start_time, end_time, size=1000)
-        self.vector_store.add_logs(logs)
+        start_time = self.checkpoint.timestamp
+        if start_time is None:
+            start_time = (datetime.now() - timedelta(hours=hours_back)).isoformat()
         
-        return len(logs)
+        with metrics.trace("ingest", "refresh") as trace:
+            total = 0
+            pages = iter(self.es_connector.scan_logs_since(start_time, batch_size=self.ingest_batch_size))
+            while True:
+                with metrics.span("es_fetch"):
+                    logs = next(pages, None)
+                if logs is None:
+                    break
+                new_logs = [log for log in logs if self.checkpoint.is_new(log)]
+                if not new_logs:
+                    continue
+                
+                # Raises on a failed write, before the checkpoint moves past the page
+                written = self._ingest(new_logs)
+                with metrics.span("checkpoint"):
+                    self.checkpoint.advance(new_logs)
+                    self.checkpoint.save()
+                total += written
+            
+            # Dropping expired partitions changes results just like new logs do
+            with metrics.span("retention"):
+                dropped = self.apply_retention()
+            if total or dropped:
+                self.answer_cache.bump_version()
+        logger.info(f"Ingested {total} new logs, checkpoint at {self.checkpoint.timestamp}")
+        logger.debug(f"Refresh timings: {trace.timings()}")
+        return total
+    
+    def apply_retention(self):
+        """Expire old vector partitions and transaction index entries.
+
+        Returns the number of partitions dropped.
+        """
+        dropped = self.vector_store.enforce_retention()
+        self.transaction_index.prune(time.time() * 1000)
+        return dropped
+    
+    def _ingest(self, logs):
+        """Write a batch of logs to the vector store, mining templates if enabled.
+
+        Returns the number of logs stored (all of them in template mode,
+        where every log is folded into a template); raises if the write fails.
+        """
+        with metrics.span("transaction_index"):
+            self.transaction_index.add_logs(logs)
+        if self.template_miner:
+            with metrics.span("template_mining"):
+                templates = self.template_miner.add_logs(logs)
+            with metrics.span("template_write"):
+                self.vector_store.add_templates(templates)
+            return len(logs)
+        return self.vector_store.add_logs(logs)
     
     def _extract_special_queries(self, query):
         """Extract special queries like transaction IDs."""
@@ -53,41 +238,254 @@ class RAGPipeline:
             "value": query
         }
     
-    def process_query(self, query):
-        """Process a natural language query and return relevant logs and analysis."""
-        # Extract special query types
-        special_query = self._extract_special_queries(query)
+    def _retrieve(self, query, special_query, plan):
+        """Retrieve the relevant logs for a classified and planned query.
+
+        Returns (logs, summary); summary is an ErrorSummary for error queries
+        answered from aggregations, otherwise None.
+        """
+        if special_query["type"] == "transaction_id":
+            # Serve the timeline from the local index when the transaction was ingested
+            with metrics.span("transaction_index"):
+                logs = self.transaction_index.get_timeline(special_query["value"])
+            if logs:
+                if self.es_connector is not None:
+                    # Logs past the checkpoint are not indexed yet; fetch just that tail and merge it in
+                    with metrics.span("es_transid"):
+                        tail = self.es_connector.get_logs_by_transaction_id(
+                            special_query["value"], since=self.checkpoint.timestamp
+                        )
+                    if tail and self.transaction_index.add_logs(tail):
+                        with metrics.span("transaction_index"):
+                            logs = self.transaction_index.get_timeline(special_query["value"])
+                logger.info(f"Transaction {special_query['value']}: {len(logs)} logs from local index")
+                return logs, None
         
         # Get relevant logs based on query type
+        if special_query["type"] != "semantic" and self.es_connector is None:
+            logger.warning(f"Elasticsearch not ready, cannot serve {special_query['type']} query")
+            return [], None
+        
         if special_query["type"] == "transaction_id":
-            logs = self.es_connector.get_logs_by_transaction_id(special_query["value"])
-            if not logs:
-                # Fall back to keyword search if exact match fails
-                logs = self.es_connector.get_logs_by_keyword(special_query["value"])
+            # Local miss: run the exact lookup and the keyword fallback concurrently
+            results = self.fanout.run([
+                ("transid", metrics.timed("es_transid", self.es_connector.get_logs_by_transaction_id), (special_query["value"],)),
+                ("keyword", metrics.timed("es_keyword", self.es_connector.get_logs_by_keyword), (special_query["value"],)),
+            ], default=[])
+            # Fall back to keyword search if exact match fails
+            logs = results["transid"] or results["keyword"]
+            if results["transid"]:
+                # Write the complete timeline through so the next lookup is local
+                self.transaction_index.add_logs(results["transid"])
         elif special_query["type"] == "error_logs":
-            logs = self.es_connector.get_error_logs()
+            # Count and trend errors over the whole window server-side and
+            # hand the LLM the summary plus one exemplar per error pattern
+            summary = None
+            if self.error_analytics:
+                with metrics.span("es_error_aggregations"):
+                    summary = self.error_analytics.summarize(plan.to_es_filters())
+            if summary:
+                # Without a message keyword field there are no per-pattern exemplars
+                logs = summary.exemplars
+                if not logs:
+                    with metrics.span("es_error_logs"):
+                        logs = self.es_connector.get_error_logs(
+                            size=self.error_analytics.top_n, filters=plan.to_es_filters()
+                        )
+                return logs, summary
+            with metrics.span("es_error_logs"):
+                logs = self.es_connector.get_error_logs(filters=plan.to_es_filters())
+        elif plan.has_filters and not plan.has_text and self.es_connector is not None:
+            # Pure filter queries ("show logs from 10:00 to 11:00") just browse the slice
+            with metrics.span("es_filtered"):
+                logs = self.es_connector.get_logs_filtered(plan.to_es_filters())
         else:
-            # Use vector search for semantic queries
-            logs = self.vector_store.query_similar(query)
-            
-            # Fall back to keyword search if vector search returns no results
-            if not logs:
-                keywords = query.split()
-                for keyword in keywords:
-                    if len(keyword) > 3:  # Skip short words
-                        logs = self.es_connector.get_logs_by_keyword(keyword)
-                        if logs:
-                            break
-        
-        # Generate response using LLM
+            # Fuse keyword (BM25) and vector search for semantic queries
+            logs = self.retriever.retrieve(query, plan=plan)
+        
+        return logs, None
+    
+    def _sync_data_version(self):
+        """Mark cached answers stale when the ingest worker saved its checkpoint."""
+        try:
+            mtime = os.path.getmtime(self.checkpoint.path)
+        except OSError:
+            return
+        if mtime != self._checkpoint_mtime:
+            if self._checkpoint_mtime is not None:
+                self.answer_cache.bump_version()
+            # Transaction lookups fetch from ES whatever the worker has not indexed yet
+            self.checkpoint.load()
+            self._checkpoint_mtime = mtime
+    
+    def _cache_key(self, special_query, plan):
+        """Answer cache key: the query type, its exact value and the plan's filters."""
+        if special_query["type"] == "semantic":
+            return (special_query["type"],) + plan.cache_key()
+        return (special_query["type"], special_query["value"]) + plan.cache_key()
+    
+    def _lookup(self, query, bypass_cache=False):
+        """Classify a query and find its logs, reusing a cached answer if possible.
+
+        Returns (special_query, plan, logs, summary, probe, cached_entry);
+        cached_entry is None when the answer has to be generated. With
+        bypass_cache the cached answer is never reused, only replaced.
+        """
+        if not self.ingest_in_process:
+            self._sync_data_version()
+        
+        # Extract special query types and filters
+        with metrics.span("classify"):
+            special_query = self._extract_special_queries(query)
+        with metrics.span("plan"):
+            plan = self.planner.plan(query)
+        if special_query["type"] == "error_logs":
+            # The error query already selects error logs across level, severity and
+            # message; a level filter from the same word would only narrow it
+            plan.level = None
+        trace = metrics.current_trace()
+        if trace is not None:
+            trace.kind = special_query["type"]
+        
+        with metrics.span("answer_cache"):
+            probe = self.answer_cache.probe(query, self._cache_key(special_query, plan))
+            cached = None if bypass_cache else self.answer_cache.fresh(probe)
+        if cached:
+            return special_query, plan, cached.result["all_logs"], None, probe, cached
+        
+        logs, summary = self._retrieve(query, special_query, plan)
+        if bypass_cache:
+            return special_query, plan, logs, summary, probe, None
+        with metrics.span("answer_cache_revalidate"):
+            cached = self.answer_cache.revalidate(probe, logs)
+        return special_query, plan, logs, summary, probe, cached
+    
+    def _no_logs_message(self):
+        if self.warm_up_pending():
+            return "I couldn't find any relevant logs yet. The system is still starting up, so some log sources are not available."
+        return "I couldn't find any relevant logs for your query."
+    
+    def process_query(self, query, bypass_cache=False):
+        """Process a natural language query and return relevant logs and analysis.
+
+        The result's "timings" holds the per-stage breakdown in milliseconds
+        and Ollama's own prompt eval / generation timings. bypass_cache
+        forces a fresh answer for explicit re-runs.
+        """
+        with metrics.trace("query") as trace:
+            result = self._process_query(query, bypass_cache)
+        return dict(result, timings=trace.timings())
+    
+    def _process_query(self, query, bypass_cache=False):
+        special_query, plan, logs, summary, probe, cached = self._lookup(query, bypass_cache)
+        if cached:
+            result = {key: value for key, value in cached.result.items() if key != "all_logs"}
+            return dict(result, query=query, cached=True)
+        
+        # Generate response using LLM, packing logs into the context token budget
+        summary_text = summary.to_text() if summary else None
+        with metrics.span("context_build"):
+            context = self.context_builder.build(logs, summary_text)
         if logs:
-            response = self.llm.generate_response(query, logs[:10])  # Limit to 10 most relevant logs
+            with metrics.span("llm"):
+                response = self.llm.generate_response(query, context)
         else:
-            response = "I couldn't find any relevant logs for your query."
+            response = self._no_logs_message()
         
-        return {
+        result = {
             "query": query,
             "query_type": special_query["type"],
             "logs": logs[:10],  # Return only the top 10 logs
-            "analysis": response
+            "analysis": response,
+            "context": context.stats(),
+            "filters": plan.describe(),
+            "summary": summary_text,
+            "cached": False
         }
+        if logs and not is_error_response(response):
+            # all_logs lets a cached hit on the streaming path page through everything retrieved
+            self.answer_cache.store(probe, logs, dict(result, all_logs=logs))
+        return result
+    
+    def process_query_stream(self, query, bypass_cache=False):
+        """Process a query, yielding retrieval results first and then LLM tokens.
+
+        bypass_cache forces a fresh answer for explicit re-runs.
+
+        Yields dicts with a "type" key:
+        - "retrieval": query, query_type, logs (top 10), all_logs (everything
+          retrieved), context stats, applied filters, the error summary (if
+          any) and whether the answer comes from the cache, as soon as
+          retrieval is done
+        - "token": one chunk of analysis text
+        - "done": the complete analysis, whether generation failed ("error")
+          and the query's timings
+        """
+        with metrics.trace("query") as trace:
+            for event in self._process_query_stream(query, bypass_cache):
+                if event["type"] == "done":
+                    event["timings"] = trace.timings()
+                yield event
+    
+    def _process_query_stream(self, query, bypass_cache=False):
+        special_query, plan, logs, summary, probe, cached = self._lookup(query, bypass_cache)
+        if cached:
+            result = cached.result
+            yield {
+                "type": "retrieval",
+                "query": query,
+                "query_type": result["query_type"],
+                "logs": result["logs"],
+                "all_logs": logs,
+                "context": result["context"],
+                "filters": result["filters"],
+                "summary": result.get("summary"),
+                "cached": True
+            }
+            yield {"type": "token", "text": result["analysis"]}
+            yield {"type": "done", "analysis": result["analysis"]}
+            return
+        
+        summary_text = summary.to_text() if summary else None
+        with metrics.span("context_build"):
+            context = self.context_builder.build(logs, summary_text)
+        
+        yield {
+            "type": "retrieval",
+            "query": query,
+            "query_type": special_query["type"],
+            "logs": logs[:10],
+            "all_logs": logs,
+            "context": context.stats(),
+            "filters": plan.describe(),
+            "summary": summary_text,
+            "cached": False
+        }
+        
+        if not logs:
+            analysis = self._no_logs_message()
+            yield {"type": "token", "text": analysis}
+            yield {"type": "done", "analysis": analysis}
+            return
+        
+        chunks = []
+        failed = False
+        with metrics.span("llm"):
+            for chunk in self.llm.generate_response_stream(query, context):
+                # The stream reports failures as a whole fallback chunk, possibly after partial tokens
+                failed = failed or is_error_response(chunk)
+                chunks.append(chunk)
+                yield {"type": "token", "text": chunk}
+        analysis = "".join(chunks)
+        if not failed:
+            self.answer_cache.store(probe, logs, {
+                "query": query,
+                "query_type": special_query["type"],
+                "logs": logs[:10],
+                "all_logs": logs,
+                "analysis": analysis,
+                "context": context.stats(),
+                "filters": plan.describe(),
+                "summary": summary_text
+            })
+        yield {"type": "done", "analysis": analysis, "error": failed}
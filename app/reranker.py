@@ -0,0 +1,138 @@
+import os
+import re
+import time
+import logging
+from dotenv import load_dotenv
+from vector_store import PRIORITY_FIELDS
+from retrieval import CODE_TOKEN
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Query words too common to count as overlap
+STOPWORDS = {
+    "the", "a", "an", "of", "in", "on", "for", "to", "and", "or", "is", "are", "was", "why", "what", "how",
+    "show", "me", "log", "logs", "any", "with", "from", "có", "không", "các", "của", "trong", "cho", "tại", "sao",
+}
+
+
+def log_text(log, max_chars=512):
+    """Text of a log's priority fields, as scored by the reranker."""
+    text = " ".join(str(log[field]) for field in PRIORITY_FIELDS if log.get(field))
+    return text[:max_chars]
+
+
+def query_terms(query):
+    """Return {term: weight} for a query; code-like tokens weigh double."""
+    terms = {}
+    for word in re.findall(r"[\w.-]+", query):
+        term = word.lower()
+        if len(term) < 2 or term in STOPWORDS:
+            continue
+        terms[term] = 2.0 if CODE_TOKEN.fullmatch(word) else 1.0
+    return terms
+
+
+class Reranker:
+    """Rerank retrieved candidates within a hard latency budget.
+
+    Candidates are scored in batches of RERANK_BATCH_SIZE with a CPU
+    cross-encoder (RERANK_MODEL, loaded by load()) or, without one, a cheap
+    weighted term-overlap scorer blended with the original rank. If scoring
+    has not finished when RERANK_BUDGET_MS runs out, the original order is
+    returned unchanged. Batches shrink to what the remaining budget allows,
+    based on the measured time per candidate, so a single batch cannot
+    overrun it by much; the first batch of every request is at least one
+    candidate, which keeps the estimate up to date.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+        self.model_name = os.getenv("RERANK_MODEL", "")
+        self.budget_ms = float(os.getenv("RERANK_BUDGET_MS", "150"))
+        self.batch_size = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+        self.prior_weight = float(os.getenv("RERANK_PRIOR_WEIGHT", "0.3"))
+        self.max_text_chars = int(os.getenv("RERANK_MAX_TEXT_CHARS", "512"))
+        self.model = None
+        self.over_budget = 0
+        # Moving average of seconds per scored candidate
+        self._item_seconds = None
+
+    def load(self):
+        """Load the cross-encoder if RERANK_MODEL is set, keeping the lexical scorer on failure."""
+        if not self.enabled or not self.model_name:
+            return
+        try:
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(self.model_name, max_length=256)
+            # The first predict is much slower than the rest; keep it out of the per-candidate estimate
+            self.model.predict([("warm up", "warm up")])
+            logger.info(f"Loaded reranking model: {self.model_name}")
+        except Exception as e:
+            logger.error(f"Error loading reranking model, using lexical reranking: {e}")
+
+    def _score_lexical(self, terms, texts, offset):
+        total = sum(terms.values()) or 1.0
+        scores = []
+        for rank, text in enumerate(texts, start=offset):
+            words = set(re.findall(r"[\w.-]+", text.lower()))
+            overlap = sum(weight for term, weight in terms.items() if term in words) / total
+            scores.append(overlap + self.prior_weight / (1 + rank))
+        return scores
+
+    def _score_model(self, query, texts):
+        return [float(score) for score in self.model.predict([(query, text) for text in texts], batch_size=self.batch_size)]
+
+    def _over_budget(self, logs):
+        self.over_budget += 1
+        logger.warning(f"Reranking exceeded {self.budget_ms:.0f}ms budget, keeping retrieval order")
+        return logs
+
+    def rerank(self, query, logs):
+        """Return logs reordered by relevance to query, or unchanged if over budget."""
+        if not self.enabled or len(logs) < 2:
+            return logs
+
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000.0
+        terms = query_terms(query)
+        texts = [log_text(log, self.max_text_chars) for log in logs]
+
+        scores = []
+        i = 0
+        while i < len(texts):
+            remaining = deadline - time.perf_counter()
+            size = self.batch_size
+            if self._item_seconds:
+                # Only start what is expected to finish within the budget, but
+                # always score at least one candidate per request so a stale
+                # estimate from one slow batch gets re-measured
+                size = min(size, int(remaining / self._item_seconds))
+                if not scores:
+                    size = max(size, 1)
+            if remaining <= 0 or size < 1:
+                # Decay the estimate so one slow outlier cannot keep every later request skipped
+                if self._item_seconds:
+                    self._item_seconds *= 0.5
+                return self._over_budget(logs)
+            batch = texts[i:i + size]
+            batch_start = time.perf_counter()
+            try:
+                if self.model is not None:
+                    scores.extend(self._score_model(query, batch))
+                else:
+                    scores.extend(self._score_lexical(terms, batch, i))
+            except Exception as e:
+                logger.error(f"Error reranking candidates: {e}")
+                return logs
+            item_seconds = (time.perf_counter() - batch_start) / len(batch)
+            self._item_seconds = item_seconds if self._item_seconds is None else 0.8 * self._item_seconds + 0.2 * item_seconds
+            i += len(batch)
+        if time.perf_counter() > deadline:
+            return self._over_budget(logs)
+
+        order = sorted(range(len(logs)), key=lambda i: scores[i], reverse=True)
+        logger.info(f"Reranked {len(logs)} candidates in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return [logs[i] for i in order]
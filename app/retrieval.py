@@ -0,0 +1,103 @@
+import os
+import re
+import logging
+from dotenv import load_dotenv
+from vector_store import log_id
+import metrics
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Tokens that look like identifiers or error codes (E1023, ERR_TIMEOUT, 504)
+CODE_TOKEN = re.compile(r"\b(?=[A-Za-z_-]*\d|[A-Z]{2,}_)[A-Za-z0-9_-]{3,}\b")
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """Fuse ranked lists of logs with weighted reciprocal rank fusion.
+
+    ranked_lists is a list of (logs, weight) pairs. Each log scores
+    weight / (k + rank) per list it appears in; logs are deduplicated by
+    log_id and returned best first.
+    """
+    scores = {}
+    logs_by_id = {}
+    for logs, weight in ranked_lists:
+        for rank, log in enumerate(logs, start=1):
+            current_id = log_id(log)
+            scores[current_id] = scores.get(current_id, 0.0) + weight / (k + rank)
+            logs_by_id.setdefault(current_id, log)
+    ranked_ids = sorted(scores, key=lambda i: scores[i], reverse=True)
+    return [logs_by_id[i] for i in ranked_ids]
+
+
+class HybridRetriever:
+    """Retrieve logs with Elasticsearch BM25 and Chroma kNN, fused with RRF.
+
+    Both retrievers run concurrently through a FanOut and fetch
+    HYBRID_CANDIDATES results each. Queries containing code-like tokens (error
+    codes, IDs) weight the keyword results by HYBRID_CODE_BOOST, since
+    embeddings match those poorly. A retriever that is None (still starting
+    up) is skipped. With a Reranker, the whole fused candidate list is
+    reranked before it is cut to n_results.
+    """
+
+    def __init__(self, es_connector, vector_store, fanout, reranker=None):
+        self.es_connector = es_connector
+        self.vector_store = vector_store
+        self.fanout = fanout
+        self.reranker = reranker
+        self.candidates = int(os.getenv("HYBRID_CANDIDATES", "20"))
+        self.rrf_k = int(os.getenv("HYBRID_RRF_K", "60"))
+        self.keyword_weight = float(os.getenv("HYBRID_KEYWORD_WEIGHT", "1.0"))
+        self.vector_weight = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+        self.code_boost = float(os.getenv("HYBRID_CODE_BOOST", "2.0"))
+
+    def _weights(self, query):
+        """Return (keyword_weight, vector_weight) for a query."""
+        if CODE_TOKEN.search(query):
+            return self.keyword_weight * self.code_boost, self.vector_weight
+        return self.keyword_weight, self.vector_weight
+
+    def retrieve(self, query, n_results=10, plan=None):
+        """Return up to n_results fused logs for a query.
+
+        With a QueryPlan, the keyword leg searches the plan's remaining text
+        within its ES filters and the vector leg pushes its filters down to
+        the vector store. In template mode, expanded member logs are checked
+        against the plan afterwards.
+        """
+        keyword_text = plan.text if plan is not None and plan.has_text else query
+        es_filters = plan.to_es_filters() if plan is not None else None
+        vector_filters = plan.to_vector_filters() if plan is not None else None
+        post_filter = (
+            plan is not None and plan.has_filters
+            and self.vector_store is not None and self.vector_store.template_store is not None
+        )
+        # Over-fetch vector candidates when part of the filter is applied afterwards
+        vector_candidates = self.candidates * 3 if post_filter else self.candidates
+
+        calls = []
+        if self.es_connector is not None:
+            calls.append(("keyword", metrics.timed("es_keyword_search", self.es_connector.search_logs),
+                          (keyword_text, self.candidates, es_filters)))
+        if self.vector_store is not None:
+            calls.append(("vector", metrics.timed("vector_search", self.vector_store.query_similar),
+                          (query, vector_candidates, vector_filters)))
+        results = self.fanout.run(calls, default=[])
+        keyword_logs = results.get("keyword", [])
+        vector_logs = results.get("vector", [])
+        if post_filter:
+            vector_logs = [log for log in vector_logs if plan.matches(log)][:self.candidates]
+
+        keyword_weight, vector_weight = self._weights(query)
+        fused = reciprocal_rank_fusion(
+            [(keyword_logs, keyword_weight), (vector_logs, vector_weight)],
+            k=self.rrf_k
+        )
+        logger.info(f"Hybrid retrieval: {len(keyword_logs)} keyword + {len(vector_logs)} vector -> {len(fused)} fused")
+        if self.reranker is not None:
+            with metrics.span("rerank"):
+                fused = self.reranker.rerank(keyword_text, fused)
+        return fused[:n_results]
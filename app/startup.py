@@ -0,0 +1,71 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupTracker:
+    """Readiness state and timing of each application startup phase."""
+
+    def __init__(self, phases):
+        self.created = time.time()
+        self._lock = threading.Lock()
+        self._phases = {name: self._new_phase() for name in phases}
+
+    @staticmethod
+    def _new_phase():
+        return {"status": PENDING, "started": None, "seconds": None, "error": None}
+
+    @contextmanager
+    def phase(self, name):
+        """Time a startup phase, marking it ready or failed when it ends."""
+        start = time.perf_counter()
+        with self._lock:
+            self._phases.setdefault(name, self._new_phase())
+            self._phases[name].update(status=RUNNING, started=time.time() - self.created)
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self._phases[name].update(status=FAILED, seconds=time.perf_counter() - start, error=str(e))
+            logger.error(f"Startup phase '{name}' failed after {time.perf_counter() - start:.2f}s: {e}")
+            raise
+        with self._lock:
+            self._phases[name].update(status=READY, seconds=time.perf_counter() - start)
+        logger.info(f"Startup phase '{name}' ready in {time.perf_counter() - start:.2f}s")
+
+    def status(self, name):
+        with self._lock:
+            return self._phases.get(name, {}).get("status", PENDING)
+
+    def is_ready(self, name):
+        return self.status(name) == READY
+
+    @property
+    def all_ready(self):
+        with self._lock:
+            return all(phase["status"] == READY for phase in self._phases.values())
+
+    def report(self):
+        """Return a copy of the phase states, in registration order."""
+        with self._lock:
+            return {name: dict(phase) for name, phase in self._phases.items()}
+
+    def log_report(self):
+        lines = []
+        for name, phase in self.report().items():
+            seconds = f"{phase['seconds']:.2f}s" if phase["seconds"] is not None else "-"
+            lines.append(f"  {name:<16} {phase['status']:<8} {seconds}")
+        logger.info("Startup timing report:\n" + "\n".join(lines))
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_planner import QueryPlanner
+
+
+@pytest.mark.parametrize("query, service", [
+    ("Why did the service fail?", None),
+    ("service is down since 10:00", None),
+    ("dịch vụ nào bị lỗi trong 2 giờ qua", None),
+    ("which module failed today", None),
+    ("show logs from payment service in the last hour", "payment"),
+    ("Hiển thị log từ module payment trong 2 giờ qua", "payment"),
+    ("why did the topup service fail", "topup"),
+    ("dịch vụ wallet có lỗi không", "wallet"),
+])
+def test_service_extraction_heuristic(monkeypatch, query, service):
+    monkeypatch.delenv("QUERY_SERVICES", raising=False)
+    assert QueryPlanner().plan(query).service == service
+
+
+@pytest.mark.parametrize("query, service", [
+    ("show logs from payment service", "payment"),
+    ("logs of checkout service", None),
+    ("service gateway is slow", None),
+    ("service auth is slow", "auth"),
+])
+def test_service_extraction_known_services(monkeypatch, query, service):
+    monkeypatch.setenv("QUERY_SERVICES", "payment, topup,wallet,auth")
+    assert QueryPlanner().plan(query).service == service
+
+
+@pytest.mark.parametrize("query", [
+    "lỗi trong 99999999 ngày qua",
+    "errors in the last 99999999999 days",
+])
+def test_out_of_range_time_is_ignored(query):
+    plan = QueryPlanner().plan(query)
+    assert plan.start is None
+    assert plan.end is None
@@ -0,0 +1,86 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from dotenv import load_dotenv
+from vector_store import log_id, timestamp_to_ms
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+
+
+class TransactionIndex:
+    """Local SQLite index from transid to the time-ordered logs of that transaction.
+
+    Built incrementally at ingestion time so transaction lookups return a
+    complete timeline without querying Elasticsearch.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(
+            "TRANSACTION_INDEX_PATH", os.path.join(DATA_DIR, "transactions.sqlite")
+        )
+        self.retention_hours = float(os.getenv("TRANSACTION_INDEX_RETENTION_HOURS", "168"))
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transactions ("
+            "transid TEXT NOT NULL, log_id TEXT NOT NULL, ts_ms INTEGER, log_json TEXT NOT NULL, "
+            "PRIMARY KEY (transid, log_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_time ON transactions (transid, ts_ms)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_age ON transactions (ts_ms)")
+        self._conn.commit()
+
+    def add_logs(self, logs):
+        """Index the logs that carry a transid. Returns the number of new entries."""
+        rows = [
+            (str(log["transid"]).strip(), log_id(log), timestamp_to_ms(log.get("@timestamp")), json.dumps(log, default=str))
+            for log in logs
+            if log.get("transid")
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO transactions (transid, log_id, ts_ms, log_json) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+            added = self._conn.total_changes - before
+        logger.debug(f"Indexed {added} transaction log entries")
+        return added
+
+    def get_timeline(self, transid, limit=None):
+        """Return the logs of a transaction, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT log_json FROM transactions WHERE transid = ? ORDER BY ts_ms, log_id LIMIT ?",
+                (transid.strip(), limit or -1)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def prune(self, now_ms):
+        """Delete transactions whose newest entry is older than TRANSACTION_INDEX_RETENTION_HOURS.
+
+        Whole transactions are dropped so a lookup never returns a timeline
+        with its beginning cut off. Returns the number of entries deleted.
+        """
+        cutoff_ms = int(now_ms - self.retention_hours * 3600 * 1000)
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM transactions WHERE transid IN "
+                "(SELECT transid FROM transactions GROUP BY transid HAVING MAX(ts_ms) < ?)", (cutoff_ms,)
+            ).rowcount
+            self._conn.commit()
+        if deleted:
+            logger.info(f"Pruned {deleted} transaction index entries")
+        return deleted
@@ -2,7 +2,8 @@ import streamlit as st
 import sys
 import os
 import json
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 import pandas as pd
 
 # Add parent directory to path
@@ -30,6 +31,10 @@ This application allows you to query logs using natural language.
 Ask questions about transactions, errors, or any specific log patterns.
 """)
 
+# Degraded mode notice while components are still warming up
+if rag_pipeline.warm_up_pending():
+    st.warning("The system is still starting up. Answers may be incomplete until all components are ready (see sidebar).")
+
 # Query input
 query = st.text_input("Enter your query:", placeholder="Example: kiểm tra cho tôi giao dịch có transid ABC-123")
 
@@ -53,84 +58,220 @@ with col2:
     st.button(examples[1], on_click=set_example, args=(examples[1],), use_container_width=True)
     st.button(examples[3], on_click=set_example, args=(examples[3],), use_container_width=True)
 
-# Process query
-if query:
-    with st.spinner("Analyzing logs..."):
-        result = rag_pipeline.process_query(query)
+# Query results kept per session, so widget interactions re-render instead of re-querying
+MAX_STORED_RESULTS = 20
+LOGS_PAGE_SIZE = 20
+
+if "results" not in st.session_state:
+    st.session_state.results = {}
+
+def forget_result(query):
+    """Drop a stored result so the query runs again on this rerun, past the answer cache."""
+    st.session_state.results.pop(query, None)
+    st.session_state.bypass_cache = query
+
+def store_result(query, result):
+    results = st.session_state.results
+    results.pop(query, None)
+    results[query] = result
+    while len(results) > MAX_STORED_RESULTS:
+        results.pop(next(iter(results)))
+
+def build_log_table(logs):
+    """Flatten logs for display and build their DataFrame, once per result.
+
+    Returns (dataframe, flattened logs); dataframe is None if the logs do
+    not fit a table.
+    """
+    logs_for_display = []
+    for log in logs:
+        flat_log = {}
+        
+        # Priority fields to show first
+        priority_fields = ["@timestamp", "transid", "message", "level", "service"]
+        
+        # Add priority fields first
+        for field in priority_fields:
+            if field in log:
+                # Format timestamp
+                if field == "@timestamp" and isinstance(log[field], str):
+                    try:
+                        dt = datetime.fromisoformat(log[field].replace('Z', '+00:00'))
+                        flat_log[field] = dt.strftime("%Y-%m-%d %H:%M:%S")
+                    except:
+                        flat_log[field] = log[field]
+                else:
+                    flat_log[field] = log[field]
+        
+        # Add remaining fields
+        for key, value in log.items():
+            if key not in priority_fields:
+                flat_log[key] = value
+        
+        logs_for_display.append(flat_log)
     
-    # Display AI analysis
-    st.markdown("### Analysis")
-    st.write(result["analysis"])
+    if not logs_for_display:
+        return None, logs_for_display
     
-    # Display relevant logs
+    # Convert to DataFrame for display
+    try:
+        # Use common columns across all logs
+        common_columns = set.intersection(*[set(log.keys()) for log in logs_for_display])
+        common_columns = list(common_columns)
+        
+        # Prioritize certain columns if they exist
+        for col in reversed(["message", "transid", "@timestamp"]):
+            if col in common_columns:
+                common_columns.remove(col)
+                common_columns.insert(0, col)
+        
+        return pd.DataFrame(logs_for_display)[common_columns], logs_for_display
+    except Exception:
+        return None, logs_for_display
+
+def render_logs(result):
+    """Render a result's log table one page at a time, with a raw JSON expander."""
     st.markdown("### Relevant Logs")
     
-    if result["logs"]:
-        # Flatten and clean up logs for display
-        logs_for_display = []
-        for log in result["logs"]:
-            flat_log = {}
-            
-            # Priority fields to show first
-            priority_fields = ["@timestamp", "transid", "message", "level", "service"]
-            
-            # Add priority fields first
-            for field in priority_fields:
-                if field in log:
-                    # Format timestamp
-                    if field == "@timestamp" and isinstance(log[field], str):
-                        try:
-                            dt = datetime.fromisoformat(log[field].replace('Z', '+00:00'))
-                            flat_log[field] = dt.strftime("%Y-%m-%d %H:%M:%S")
-                        except:
-                            flat_log[field] = log[field]
-                    else:
-                        flat_log[field] = log[field]
-            
-            # Add remaining fields
-            for key, value in log.items():
-                if key not in priority_fields:
-                    flat_log[key] = value
-            
-            logs_for_display.append(flat_log)
-        
-        # Convert to DataFrame for display
-        try:
-            # Use common columns across all logs
-            common_columns = set.intersection(*[set(log.keys()) for log in logs_for_display])
-            common_columns = list(common_columns)
-            
-            # Prioritize certain columns if they exist
-            for col in reversed(["message", "transid", "@timestamp"]):
-                if col in common_columns:
-                    common_columns.remove(col)
-                    common_columns.insert(0, col)
-            
-            df = pd.DataFrame(logs_for_display)[common_columns]
-            st.dataframe(df, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error displaying logs as table: {e}")
-            # Fallback to JSON display
-            st.json(logs_for_display)
-    else:
+    logs = result["logs"]
+    df, logs_for_display = result["table"]
+    if not logs:
         st.info("No relevant logs found for your query.")
+        return
+    
+    pages = (len(logs) + LOGS_PAGE_SIZE - 1) // LOGS_PAGE_SIZE
+    page = 1
+    if pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, key=f"logs_page_{result['id']}")
+    start = (page - 1) * LOGS_PAGE_SIZE
+    end = start + LOGS_PAGE_SIZE
+    
+    if df is not None:
+        st.dataframe(df.iloc[start:end], use_container_width=True)
+    else:
+        st.error("Error displaying logs as table")
+        # Fallback to JSON display
+        st.json(logs_for_display[start:end])
     
     # Option to view raw logs
     with st.expander("View Raw Logs"):
-        st.json(result["logs"])
+        st.json(logs[start:end])
+
+def render_retrieval(result):
+    """Render applied filters, context stats, the error summary and the logs."""
+    context = result["context"]
+    if result["filters"]:
+        st.caption(f"Filters: {result['filters']}")
+    st.caption(f"LLM context: {context['logs_used']}/{context['logs_total']} logs in "
+               f"~{context['tokens_used']}/{context['token_budget']} tokens"
+               + (" · cached answer" if result["cached"] else ""))
+    if result.get("summary"):
+        with st.expander("Error summary (all matching logs)"):
+            st.text(result["summary"])
+    render_logs(result)
+
+def render_timings(timings):
+    """Render the per-stage timing breakdown of a query."""
+    with st.expander(f"Timing breakdown ({timings['total_ms'] / 1000:.2f}s)"):
+        if timings["stages"]:
+            df = pd.DataFrame(
+                [{"stage": stage, "ms": ms} for stage, ms in timings["stages"].items()]
+            ).set_index("stage")
+            st.bar_chart(df)
+            st.dataframe(df, use_container_width=True)
+        llm = timings.get("llm") or {}
+        if llm:
+            st.caption(
+                f"LLM: load {llm.get('load_ms', 0):.0f} ms · "
+                f"prompt eval {llm.get('prompt_tokens', '-')} tokens in {llm.get('prompt_eval_ms', 0):.0f} ms · "
+                f"generation {llm.get('generated_tokens', '-')} tokens in {llm.get('eval_ms', 0):.0f} ms"
+                + (f" ({llm['tokens_per_sec']} tokens/s)" if llm.get("tokens_per_sec") else "")
+            )
+
+def run_query(query, analysis_placeholder):
+    """Stream a query through the pipeline, rendering as it goes. Returns the result to store."""
+    analysis_placeholder.info("Searching logs...")
+    
+    result = None
+    analysis = ""
+    # An explicit re-run asks for a fresh answer, not the pipeline's cached one
+    bypass_cache = st.session_state.pop("bypass_cache", None) == query
+    for event in rag_pipeline.process_query_stream(query, bypass_cache=bypass_cache):
+        if event["type"] == "retrieval":
+            result = dict(event, id=f"{time.time_ns()}", ran_at=datetime.now())
+            # Keep everything retrieved (e.g. a whole transaction timeline) for the paged table
+            result["logs"] = result.pop("all_logs", None) or event["logs"]
+            result["table"] = build_log_table(result["logs"])
+            render_retrieval(result)
+            if event["logs"]:
+                analysis_placeholder.info("Analyzing logs...")
+        elif event["type"] == "token":
+            analysis += event["text"]
+            analysis_placeholder.markdown(analysis + "▌")
+        elif event["type"] == "done":
+            analysis_placeholder.markdown(event["analysis"])
+            result["analysis"] = event["analysis"]
+            result["timings"] = event.get("timings")
+            if result["timings"]:
+                render_timings(result["timings"])
+    return result
+
+# Process query
+if query:
+    # Reserve the analysis slot above the logs, then fill it as tokens stream in
+    header_col, rerun_col = st.columns([5, 1])
+    with header_col:
+        st.markdown("### Analysis")
+    with rerun_col:
+        st.button("Re-run query", on_click=forget_result, args=(query,), use_container_width=True)
+    analysis_placeholder = st.empty()
+    
+    result = st.session_state.results.get(query)
+    if result is None:
+        result = run_query(query, analysis_placeholder)
+        if result is not None and "analysis" in result:
+            store_result(query, result)
+    else:
+        # Same question as an earlier run in this session: re-render, don't re-query
+        analysis_placeholder.markdown(result["analysis"])
+        st.caption(f"Result from {result['ran_at'].strftime('%H:%M:%S')} · use Re-run query for fresh results")
+        render_retrieval(result)
+        if result.get("timings"):
+            render_timings(result["timings"])
 
 # System status and info
 with st.sidebar:
     st.subheader("System Information")
     
-    # Refresh logs button
-    if st.button("Refresh Logs Cache"):
-        with st.spinner("Refreshing logs..."):
-            logs_count = rag_pipeline.refresh_logs()
-            st.success(f"Refreshed {logs_count} logs")
+    # Refresh logs button, only when this process owns ingestion
+    if rag_pipeline.ingest_in_process:
+        if st.button("Refresh Logs Cache"):
+            with st.spinner("Refreshing logs..."):
+                logs_count = rag_pipeline.refresh_logs()
+                st.success(f"Refreshed {logs_count} logs")
+    else:
+        st.caption("Logs are ingested by the ingest worker")
     
     # System status
-    st.markdown("**Status**: 🟢 Online")
+    startup_report = rag_pipeline.startup.report()
+    if not rag_pipeline.warm_up_pending():
+        st.markdown("**Status**: 🟢 Online")
+    elif any(phase["status"] == "failed" for phase in startup_report.values()):
+        st.markdown("**Status**: 🔴 Degraded")
+    else:
+        st.markdown("**Status**: 🟡 Starting up")
+    
+    status_icons = {"pending": "⚪", "running": "🟡", "ready": "🟢", "failed": "🔴"}
+    with st.expander("Startup details", expanded=rag_pipeline.warm_up_pending()):
+        for name, phase in startup_report.items():
+            seconds = f" ({phase['seconds']:.1f}s)" if phase["seconds"] is not None else ""
+            st.markdown(f"{status_icons.get(phase['status'], '⚪')} {name}: {phase['status']}{seconds}")
+            if phase["error"]:
+                st.caption(phase["error"])
+        if rag_pipeline.warm_up_pending():
+            st.caption("Failed components are retried in the background")
+        if st.button("Check again"):
+            st.experimental_rerun()
     
     # Add time ranges for quick queries
     st.subheader("Quick Time Ranges")
@@ -138,9 +279,8 @@ with st.sidebar:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Last Hour"):
-            end_time = datetime.now()
-            start_time = end_time - timedelta(hours=1)
-            query = f"Show logs from {start_time.strftime('%H:%M')} to {end_time.strftime('%H:%M')}"
+            # Relative, so the planner resolves it in QUERY_TIMEZONE rather than the server clock's zone
+            query = "Show logs from the last 1 hour"
             st.session_state.query = query
     with col2:
         if st.button("Last 24 Hours"):
@@ -1,19 +1,96 @@
 import os
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 import logging
-import requests
+import re
 import time
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from embeddings import EmbeddingEngine, EmbeddingError
+from http_client import get_session, get_timeout
+from local_index import LocalIndexClient
+from fanout import FanOut
+import metrics
 
 load_dotenv()
 
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 
+# Priority fields that describe a log, most useful first
+PRIORITY_FIELDS = ["@timestamp", "message", "log", "details", "transid", "level", "service"]
+
+# Normalized, filterable copies of log fields stored alongside the log metadata
+INDEX_FIELDS = ("_ts_ms", "_service", "_level", "_transid")
+
+def timestamp_to_ms(value):
+    """Convert an ISO-8601 timestamp to epoch milliseconds (naive means UTC), or None."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+def index_metadata(log):
+    """Return the normalized filter fields for a log."""
+    metadata = {}
+    timestamp_ms = timestamp_to_ms(log.get("@timestamp"))
+    if timestamp_ms is not None:
+        metadata["_ts_ms"] = timestamp_ms
+    if log.get("service"):
+        metadata["_service"] = str(log["service"]).strip().lower()
+    if log.get("level"):
+        metadata["_level"] = str(log["level"]).strip().upper()
+    if log.get("transid"):
+        metadata["_transid"] = str(log["transid"]).strip()
+    return metadata
+
+def build_where(filters):
+    """Compile structured filters into a Chroma ``where`` clause.
+
+    Supported keys: start_ms, end_ms (epoch millis, inclusive), service,
+    level and transid. Returns None when there is nothing to filter on.
+    """
+    if not filters:
+        return None
+    clauses = []
+    if filters.get("start_ms") is not None:
+        clauses.append({"_ts_ms": {"$gte": int(filters["start_ms"])}})
+    if filters.get("end_ms") is not None:
+        clauses.append({"_ts_ms": {"$lte": int(filters["end_ms"])}})
+    if filters.get("service"):
+        clauses.append({"_service": str(filters["service"]).lower()})
+    if filters.get("level"):
+        clauses.append({"_level": str(filters["level"]).upper()})
+    if filters.get("transid"):
+        clauses.append({"_transid": str(filters["transid"])})
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+def strip_index_fields(metadata):
+    """Drop the normalized filter fields from stored metadata, leaving the log."""
+    return {k: v for k, v in metadata.items() if k not in INDEX_FIELDS}
+
+def log_id(log):
+    """Return a stable ID for a log: its ES ``_id`` or a digest of its content."""
+    if log.get("_id"):
+        return str(log["_id"])
+    content = {k: v for k, v in log.items() if v is not None}
+    payload = json.dumps(content, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
 class VectorStore:
-    def __init__(self):
+    def __init__(self, template_store=None, embedding_engine=None):
         self.chroma_host = os.getenv("CHROMA_HOST")
         self.chroma_port = os.getenv("CHROMA_PORT")
         self.collection_name = os.getenv("CHROMA_COLLECTION")
@@ -21,32 +98,59 @@ class VectorStore:
         self.tenant = os.getenv("CHROMA_TENANT", "default_tenant")
         self.database = os.getenv("CHROMA_DATABASE", "default_database")
         self.use_local = os.getenv("CHROMA_USE_LOCAL", "false").lower() == "true"
+        self.persist_dir = os.getenv("CHROMA_PERSIST_DIR", "/app/chroma_db")
+        # Backend: chroma (HTTP server, embedded fallback) or local (in-process index)
+        self.backend = os.getenv("VECTOR_BACKEND", "chroma").lower()
+        
+        # Time partitioning: none, day or hour collections named <collection>_p<YYYYMMDD[HH]>
+        self.partitioning = os.getenv("VECTOR_PARTITION", "none").lower()
+        self.retention_hours = float(os.getenv("VECTOR_RETENTION_HOURS", "168"))
+        self._partitions = {}
+        self._partitions_listed_at = 0.0
+        self._partition_lock = threading.Lock()
+        self._partition_pattern = re.compile(rf"^{re.escape(self.collection_name)}_p(\d{{8}}|\d{{10}})$")
+        # Own pool for per-partition queries: vector searches already run on the retriever's FanOut
+        self._partition_fanout = None
+        if self.partitioning != "none":
+            self._partition_fanout = FanOut(max_workers=int(os.getenv("VECTOR_PARTITION_WORKERS", "4")))
         
         self.client = self._connect()
-        self.collection = self._get_or_create_collection()
-        try:
-            self.embedding_model = SentenceTransformer(self.embedding_model_name)
-            logger.info(f"Loaded embedding model: {self.embedding_model_name}")
-        except Exception as e:
-            logger.error(f"Error loading embedding model: {e}")
-            self.embedding_model = None
+        self.collection = None
+        if self.partitioning == "none":
+            self.collection = self._get_or_create_collection()
+        
+        # Template mode: one vector per log template, expanded via the template store
+        self.template_store = template_store
+        self.template_collection = None
+        if template_store is not None:
+            self.template_collection = self._get_or_create_collection(f"{self.collection_name}_templates")
+        self.template_expand_limit = int(os.getenv("TEMPLATE_EXPAND_LIMIT", "3"))
+        self.embedding_engine = embedding_engine or EmbeddingEngine(self.embedding_model_name)
         
+    def _connect_local(self):
+        """Create an embedded, persistent ChromaDB client."""
+        os.makedirs(self.persist_dir, exist_ok=True)
+        return chromadb.Client(Settings(
+            allow_reset=True,
+            anonymized_telemetry=False,
+            is_persistent=True,
+            persist_directory=self.persist_dir
+        ))
+    
     def _connect(self):
-        """Connect to ChromaDB."""
+        """Connect to the configured vector backend."""
+        if self.backend == "local":
+            try:
+                return LocalIndexClient()
+            except Exception as e:
+                logger.error(f"Error opening local vector index: {e}")
+                return None
+        
         try:
             # Kiểm tra cấu hình
             if self.use_local:
                 logger.info("Using local ChromaDB client as configured in .env")
-                # Cấu hình client cục bộ
-                persist_dir = "/app/chroma_db"
-                os.makedirs(persist_dir, exist_ok=True)
-                
-                client = chromadb.Client(Settings(
-                    allow_reset=True,
-                    anonymized_telemetry=False,
-                    is_persistent=True,
-                    persist_directory=persist_dir
-                ))
+                client = self._connect_local()
                 logger.info("Successfully created local ChromaDB client")
                 return client
             else:
@@ -64,7 +168,7 @@ class VectorStore:
                         v2_url = f"http://{self.chroma_host}:{self.chroma_port}/api/v2/heartbeat"
                         
                         try:
-                            response = requests.get(v1_url, timeout=5)
+                            response = get_session("chroma").get(v1_url, timeout=get_timeout(5))
                             logger.info(f"ChromaDB v1 heartbeat response: {response.status_code}")
                             if response.status_code == 200:
                                 break
@@ -72,7 +176,7 @@ class VectorStore:
                             logger.warning(f"V1 API check failed: {e_v1}")
                             
                         try:
-                            response = requests.get(v2_url, timeout=5)
+                            response = get_session("chroma").get(v2_url, timeout=get_timeout(5))
                             logger.info(f"ChromaDB v2 heartbeat response: {response.status_code}")
                             if response.status_code == 200:
                                 break
@@ -140,15 +244,7 @@ class VectorStore:
                     
                     # Fallback sang local client nếu HTTP thất bại
                     logger.info("Falling back to local ChromaDB client due to HTTP connection failure")
-                    persist_dir = "/app/chroma_db"
-                    os.makedirs(persist_dir, exist_ok=True)
-                    
-                    client = chromadb.Client(Settings(
-                        allow_reset=True,
-                        anonymized_telemetry=False,
-                        is_persistent=True,
-                        persist_directory=persist_dir
-                    ))
+                    client = self._connect_local()
                     logger.info("Created local ChromaDB client as fallback")
                     return client
                     
@@ -158,35 +254,28 @@ class VectorStore:
             # Cuối cùng, thử tạo local client
             try:
                 logger.info("Attempting to create local ChromaDB client as final fallback")
-                persist_dir = "/app/chroma_db"
-                os.makedirs(persist_dir, exist_ok=True)
-                
-                client = chromadb.Client(Settings(
-                    allow_reset=True,
-                    anonymized_telemetry=False,
-                    is_persistent=True,
-                    persist_directory=persist_dir
-                ))
+                client = self._connect_local()
                 logger.info("Created local ChromaDB client as final fallback")
                 return client
             except Exception as fallback_error:
                 logger.error(f"Failed to create fallback local client: {fallback_error}")
                 return None
     
-    def _get_or_create_collection(self):
+    def _get_or_create_collection(self, name=None):
         """Get or create a collection in ChromaDB."""
         if not self.client:
             logger.error("ChromaDB client not connected")
             return None
         
+        name = name or self.collection_name
         try:
             try:
                 collections = self.client.list_collections()
                 collection_names = [c.name for c in collections]
                 
-                if self.collection_name in collection_names:
-                    collection = self.client.get_collection(self.collection_name)
-                    logger.info(f"Using existing collection: {self.collection_name}")
+                if name in collection_names:
+                    collection = self.client.get_collection(name)
+                    logger.info(f"Using existing collection: {name}")
                     return collection
             except Exception as e:
                 logger.warning(f"Error listing collections: {e}, trying to create new collection")
@@ -195,10 +284,10 @@ class VectorStore:
             try:
                 # Phiên bản cơ bản nhất
                 collection = self.client.create_collection(
-                    name=self.collection_name,
+                    name=name,
                     metadata={"description": "Logs collection for RAG"}
                 )
-                logger.info(f"Created new collection: {self.collection_name}")
+                logger.info(f"Created new collection: {name}")
                 return collection
             except TypeError as te:
                 if "missing 1 required positional argument: 'embedding_function'" in str(te):
@@ -209,11 +298,11 @@ class VectorStore:
                         return [[0.0] * 768 for _ in texts]
                     
                     collection = self.client.create_collection(
-                        name=self.collection_name,
+                        name=name,
                         embedding_function=dummy_embedding_function,
                         metadata={"description": "Logs collection for RAG"}
                     )
-                    logger.info(f"Created new collection with dummy embedding function: {self.collection_name}")
+                    logger.info(f"Created new collection with dummy embedding function: {name}")
                     return collection
                 else:
                     raise
@@ -221,95 +310,258 @@ class VectorStore:
             logger.error(f"Error getting or creating collection: {e}")
             return None
     
-    def generate_embedding(self, text):
-        """Generate embedding for a text."""
-        if self.embedding_model is None:
-            logger.error("Embedding model not initialized")
-            return [0.0] * 384  # Return zero vector as fallback
+    def _partition_name(self, timestamp_ms):
+        """Return the partition collection name for an epoch-millis timestamp."""
+        moment = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+        suffix = moment.strftime("%Y%m%d%H" if self.partitioning == "hour" else "%Y%m%d")
+        return f"{self.collection_name}_p{suffix}"
+    
+    def _partition_bounds(self, name):
+        """Return the [start_ms, end_ms) range covered by a partition name."""
+        suffix = self._partition_pattern.match(name).group(1)
+        if len(suffix) == 10:
+            start = datetime.strptime(suffix, "%Y%m%d%H").replace(tzinfo=timezone.utc)
+            end = start + timedelta(hours=1)
+        else:
+            start = datetime.strptime(suffix, "%Y%m%d").replace(tzinfo=timezone.utc)
+            end = start + timedelta(days=1)
+        return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+    
+    def _list_partitions(self, max_age=60):
+        """Return the known partition names, re-listing collections every max_age seconds.
+
+        A re-list replaces the known set, so partitions dropped by another
+        process (the ingest worker's retention) are forgotten here too.
+        """
+        with self._partition_lock:
+            if time.time() - self._partitions_listed_at > max_age:
+                try:
+                    names = [c.name for c in self.client.list_collections()]
+                    self._partitions = {
+                        name: self._partitions.get(name)
+                        for name in names if self._partition_pattern.match(name)
+                    }
+                    self._partitions_listed_at = time.time()
+                except Exception as e:
+                    logger.warning(f"Error listing partitions: {e}")
+            return sorted(self._partitions)
+    
+    def _get_partition(self, name):
+        """Return the collection for a partition, creating it if needed."""
+        with self._partition_lock:
+            collection = self._partitions.get(name)
+        if collection is None:
+            collection = self._get_or_create_collection(name)
+            with self._partition_lock:
+                self._partitions[name] = collection
+        return collection
+    
+    def _partitions_for(self, filters):
+        """Return the partitions overlapping the time range in filters."""
+        start_ms = (filters or {}).get("start_ms")
+        end_ms = (filters or {}).get("end_ms")
+        selected = []
+        for name in self._list_partitions():
+            partition_start, partition_end = self._partition_bounds(name)
+            if start_ms is not None and partition_end <= start_ms:
+                continue
+            if end_ms is not None and partition_start > end_ms:
+                continue
+            selected.append(name)
+        return selected
+    
+    def _route(self, logs_by_id):
+        """Yield (collection, {log ID: log}) groups for writing."""
+        if self.partitioning == "none":
+            yield self.collection, logs_by_id
+            return
         
+        now_ms = int(time.time() * 1000)
+        groups = {}
+        for current_id, log in logs_by_id.items():
+            timestamp_ms = timestamp_to_ms(log.get("@timestamp")) or now_ms
+            groups.setdefault(self._partition_name(timestamp_ms), {})[current_id] = log
+        for name, group in sorted(groups.items()):
+            yield self._get_partition(name), group
+    
+    def enforce_retention(self):
+        """Drop partitions entirely older than VECTOR_RETENTION_HOURS.
+
+        Returns the number of partitions deleted.
+        """
+        if self.partitioning == "none" or not self.client:
+            return 0
+        
+        cutoff_ms = int((time.time() - self.retention_hours * 3600) * 1000)
+        dropped = 0
+        for name in self._list_partitions(max_age=0):
+            _, partition_end = self._partition_bounds(name)
+            if partition_end > cutoff_ms:
+                continue
+            try:
+                self.client.delete_collection(name)
+                with self._partition_lock:
+                    self._partitions.pop(name, None)
+                dropped += 1
+                logger.info(f"Dropped expired partition {name}")
+            except Exception as e:
+                logger.error(f"Error dropping partition {name}: {e}")
+        return dropped
+    
+    def generate_embedding(self, text):
+        """Generate embedding for a text, or None if it could not be embedded."""
         try:
-            return self.embedding_model.encode(text).tolist()
-        except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
-            return [0.0] * 384  # Return zero vector as fallback
+            return self.embedding_engine.encode([text])[0]
+        except EmbeddingError:
+            return None
+    
+    def _existing_ids(self, collection, ids, chunk_size=500):
+        """Return the subset of ids already stored in a collection."""
+        existing = set()
+        for i in range(0, len(ids), chunk_size):
+            result = collection.get(ids=ids[i:i + chunk_size], include=[])
+            existing.update(result.get("ids", []))
+        return existing
+    
+    def prepare_logs(self, logs_by_id):
+        """Build (ids, documents, metadatas) for a dict of log ID -> log."""
+        ids = []
+        documents = []
+        metadatas = []
+        
+        for current_id, log in logs_by_id.items():
+            try:
+                # Create a text representation of the log
+                log_text = self._log_to_text(log)
+                
+                # Store original log as metadata
+                # Convert non-supported types to strings
+                metadata = {}
+                for k, v in log.items():
+                    if v is None:
+                        metadata[k] = ""
+                    elif isinstance(v, (str, int, float, bool)):
+                        metadata[k] = v
+                    elif isinstance(v, list) and all(isinstance(i, (str, int, float, bool, type(None))) for i in v):
+                        metadata[k] = str(v)
+                    elif isinstance(v, dict):
+                        metadata[k] = str(v)
+                    else:
+                        metadata[k] = str(v)
+                
+                ids.append(current_id)
+                documents.append(log_text)
+                metadata.update(index_metadata(log))
+                metadatas.append(metadata)
+            except Exception as e:
+                logger.error(f"Error processing log: {e}")
+                logger.debug(f"Problematic log: {log}")
+                continue
+        
+        return ids, documents, metadatas
+    
+    def write_batch(self, collection, ids, documents, metadatas, embeddings=None):
+        """Upsert prepared logs into a collection, embedding them if needed."""
+        if embeddings is None and self.embedding_engine.available:
+            start = time.perf_counter()
+            with metrics.span("embed"):
+                embeddings = self.embedding_engine.encode(documents)
+            elapsed = time.perf_counter() - start
+            logger.info(f"Embedded {len(ids)} logs in {elapsed:.2f}s ({len(ids) / max(elapsed, 1e-9):.1f} docs/sec)")
+        
+        with metrics.span("vector_write"):
+            if embeddings is not None:
+                collection.upsert(
+                    ids=ids,
+                    embeddings=embeddings,
+                    documents=documents,
+                    metadatas=metadatas
+                )
+            else:
+                # Let Chroma's default embedding function handle it
+                collection.upsert(
+                    ids=ids,
+                    documents=documents,
+                    metadatas=metadatas
+                )
+        metrics.INGESTED_LOGS.inc(len(ids))
+        return len(ids)
+    
+    def plan_writes(self, logs):
+        """Deduplicate logs, route them and drop the ones already stored.
+
+        Returns a list of (collection, ids, documents, metadatas) ready for
+        write_batch, one per target collection.
+        """
+        # Deduplicate within the batch, keeping the first occurrence
+        logs_by_id = {}
+        for log in logs:
+            try:
+                logs_by_id.setdefault(log_id(log), log)
+            except Exception as e:
+                logger.error(f"Error computing log ID: {e}")
+                logger.debug(f"Problematic log: {log}")
+        
+        writes = []
+        for collection, group in self._route(logs_by_id):
+            if collection is None:
+                # Skipping the group would let the caller checkpoint past unstored logs
+                raise RuntimeError("ChromaDB collection not available")
+            
+            existing = self._existing_ids(collection, list(group))
+            if existing:
+                logger.info(f"Skipping {len(existing)} logs already in {collection.name}")
+            
+            new_logs = {i: log for i, log in group.items() if i not in existing}
+            if new_logs:
+                writes.append((collection, *self.prepare_logs(new_logs)))
+        return writes
     
     def add_logs(self, logs):
-        """Add logs to the vector store."""
-        if not self.collection:
-            logger.error("ChromaDB collection not available")
-            return
+        """Add logs to the vector store, skipping logs that are already stored.
+
+        With partitioning enabled each log goes to the partition of its
+        ``@timestamp``. Returns the number of logs written. Write failures
+        are logged and re-raised, so callers don't checkpoint past logs that
+        were not stored.
+        """
+        if not self.client:
+            raise RuntimeError("ChromaDB client not connected")
         
         if not logs:
             logger.warning("No logs to add to vector store")
-            return
+            return 0
         
         try:
-            ids = []
-            documents = []
-            metadatas = []
-            
-            for log in logs:
-                try:
-                    # Create a unique ID
-                    log_id = str(hash(frozenset([(k, str(v)) for k, v in log.items() if v is not None])))
-                    ids.append(log_id)
-                    
-                    # Create a text representation of the log
-                    log_text = self._log_to_text(log)
-                    documents.append(log_text)
-                    
-                    # Store original log as metadata
-                    # Convert non-supported types to strings
-                    metadata = {}
-                    for k, v in log.items():
-                        if v is None:
-                            metadata[k] = ""
-                        elif isinstance(v, (str, int, float, bool)):
-                            metadata[k] = v
-                        elif isinstance(v, list) and all(isinstance(i, (str, int, float, bool, type(None))) for i in v):
-                            metadata[k] = str(v)
-                        elif isinstance(v, dict):
-                            metadata[k] = str(v)
-                        else:
-                            metadata[k] = str(v)
-                    
-                    metadatas.append(metadata)
-                except Exception as e:
-                    logger.error(f"Error processing log: {e}")
-                    logger.debug(f"Problematic log: {log}")
-                    continue
+            total = 0
+            with metrics.span("plan_writes"):
+                writes = self.plan_writes(logs)
+            for collection, ids, documents, metadatas in writes:
+                total += self.write_batch(collection, ids, documents, metadatas)
             
-            if not ids:
-                logger.warning("No valid logs to add after processing")
-                return
+            if not total:
+                logger.info("No new logs to add after deduplication")
+                return 0
             
-            self.collection.add(
-                ids=ids,
-                documents=documents,
-                metadatas=metadatas
-            )
-            logger.info(f"Added {len(ids)} logs to vector store")
+            logger.info(f"Added {total} logs to vector store")
+            return total
         except Exception as e:
             logger.error(f"Error adding logs to vector store: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            raise
     
     def _log_to_text(self, log):
         """Convert a log dict to a text representation."""
         try:
             text_parts = []
             
-            # Priority fields that should come first
-            priority_fields = ["@timestamp", "message", "log", "details", "transid", "level", "service"]
-            
             # Add priority fields first
-            for field in priority_fields:
+            for field in PRIORITY_FIELDS:
                 if field in log and log[field]:
                     text_parts.append(f"{field}: {log[field]}")
             
             # Add remaining fields
             for key, value in log.items():
-                if key not in priority_fields and value:
+                if key not in PRIORITY_FIELDS and value:
                     text_parts.append(f"{key}: {value}")
             
             return "\n".join(text_parts)
@@ -317,37 +569,208 @@ class VectorStore:
             logger.error(f"Error converting log to text: {e}")
             return str(log)  # Fallback to string representation
     
-    def query_similar(self, query_text, n_results=5):
-        """Query for similar logs."""
-        if not self.collection:
-            logger.error("ChromaDB collection not available")
-            return []
+    def add_templates(self, templates):
+        """Upsert log templates produced by TemplateMiner.add_logs.
+
+        Only templates whose text is new or changed are re-embedded; the rest
+        just get their counts and time bounds updated. Write failures are
+        logged and re-raised, like in add_logs.
+        """
+        if not self.template_collection:
+            raise RuntimeError("Template collection not available")
+        
+        if not templates:
+            return 0
         
         try:
-            # Kiểm tra xem collection có dữ liệu không
-            count = self.collection.count()
-            if count == 0:
-                logger.warning("Collection is empty, no results to return")
-                return []
+            ids = [f"tpl-{t['template_id']}" for t in templates]
+            metadatas = [
+                {
+                    "kind": "template",
+                    "template_id": t["template_id"],
+                    "template": t["template"],
+                    "count": t["count"],
+                    "first_seen": t["first_seen"],
+                    "last_seen": t["last_seen"],
+                    "first_seen_ms": timestamp_to_ms(t["first_seen"]) or 0,
+                    "last_seen_ms": timestamp_to_ms(t["last_seen"]) or 0
+                }
+                for t in templates
+            ]
+            existing = set()
+            for i in range(0, len(ids), 500):
+                existing.update(self.template_collection.get(ids=ids[i:i + 500], include=[]).get("ids", []))
             
-            # Đảm bảo n_results không lớn hơn số lượng tài liệu trong collection
-            n_results = min(n_results, count)
+            changed = [i for i, t in enumerate(templates) if t.get("text_changed") or ids[i] not in existing]
+            changed_set = set(changed)
+            unchanged = [i for i in range(len(templates)) if i not in changed_set]
             
-            # Thực hiện truy vấn
-            results = self.collection.query(
+            if changed:
+                documents = [templates[i]["template"] for i in changed]
+                if self.embedding_engine.available:
+                    self.template_collection.upsert(
+                        ids=[ids[i] for i in changed],
+                        embeddings=self.embedding_engine.encode(documents),
+                        documents=documents,
+                        metadatas=[metadatas[i] for i in changed]
+                    )
+                else:
+                    self.template_collection.upsert(
+                        ids=[ids[i] for i in changed],
+                        documents=documents,
+                        metadatas=[metadatas[i] for i in changed]
+                    )
+            if unchanged:
+                self.template_collection.update(
+                    ids=[ids[i] for i in unchanged],
+                    metadatas=[metadatas[i] for i in unchanged]
+                )
+            logger.info(f"Embedded {len(changed)} templates, updated {len(unchanged)} template counts")
+            return len(changed)
+        except Exception as e:
+            logger.error(f"Error adding templates to vector store: {e}")
+            raise
+    
+    def _embed_query_text(self, query_text):
+        """Return query_embeddings for a kNN query, or None to let Chroma embed the text."""
+        if not self.embedding_engine.available:
+            return None
+        with metrics.span("embed_query"):
+            return self.embedding_engine.encode([query_text])
+    
+    def _query_collection(self, collection, query_text, n_results, where=None, query_embeddings=None):
+        """Run a kNN query against a collection, returning raw Chroma results.
+
+        Pass query_embeddings to reuse an embedding across collections.
+        """
+        # Kiểm tra xem collection có dữ liệu không
+        count = collection.count()
+        if count == 0:
+            logger.warning("Collection is empty, no results to return")
+            return None
+        
+        # Đảm bảo n_results không lớn hơn số lượng tài liệu trong collection
+        n_results = min(n_results, count)
+        
+        # Thực hiện truy vấn
+        if query_embeddings is None:
+            query_embeddings = self._embed_query_text(query_text)
+        if query_embeddings is not None:
+            with metrics.span("vector_query"):
+                return collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=n_results,
+                    where=where
+                )
+        with metrics.span("vector_query"):
+            return collection.query(
                 query_texts=[query_text],
-                n_results=n_results
+                n_results=n_results,
+                where=where
             )
+    
+    def _template_where(self, filters):
+        """Compile filters for the template collection: time-range overlap only."""
+        if not filters:
+            return None
+        clauses = []
+        if filters.get("start_ms") is not None:
+            clauses.append({"last_seen_ms": {"$gte": int(filters["start_ms"])}})
+        if filters.get("end_ms") is not None:
+            clauses.append({"first_seen_ms": {"$lte": int(filters["end_ms"])}})
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+    
+    def query_similar(self, query_text, n_results=5, filters=None):
+        """Query for similar logs within optional structured filters.
+
+        filters (see build_where) are pushed down to Chroma as a ``where``
+        clause, so the top-k is computed over matching logs only. With
+        partitioning, only partitions overlapping the time range are queried
+        and their hits are merged by distance.
+
+        In template mode the nearest templates are expanded back into their
+        most recent member logs, up to TEMPLATE_EXPAND_LIMIT per template.
+        Templates are only filtered by time-range overlap; callers should
+        check expanded members against the remaining filters.
+        """
+        if self.template_store is None and self.partitioning != "none":
+            return self._query_partitions(query_text, n_results, filters)
+        
+        collection = self.template_collection if self.template_store is not None else self.collection
+        if not collection:
+            logger.error("ChromaDB collection not available")
+            return []
+        
+        try:
+            if self.template_store is not None:
+                where = self._template_where(filters)
+            else:
+                where = build_where(filters)
+            results = self._query_collection(collection, query_text, n_results, where)
             
             # Kiểm tra và xử lý kết quả
             if not results or "metadatas" not in results or not results["metadatas"]:
                 logger.warning(f"No results found for query: {query_text}")
                 return []
             
-            return results.get("metadatas", [[]])[0]
+            metadatas = results.get("metadatas", [[]])[0]
+            if self.template_store is None:
+                return [strip_index_fields(metadata) for metadata in metadatas]
+            
+            logs = []
+            for metadata in metadatas:
+                logs.extend(self.template_store.get_members(metadata["template_id"], self.template_expand_limit))
+            return logs
         except Exception as e:
             logger.error(f"Error querying vector store: {e}")
             logger.error(f"Query: {query_text}")
             import traceback
             logger.error(traceback.format_exc())
             return []
+    
+    def _query_partition(self, name, query_text, n_results, where, query_embeddings):
+        return self._query_collection(self._get_partition(name), query_text, n_results, where, query_embeddings)
+    
+    def _query_partitions(self, query_text, n_results, filters):
+        """Query every partition overlapping the filters and merge hits by distance.
+
+        The query is embedded once and the partitions are queried
+        concurrently. A partition that fails (e.g. dropped by another
+        process) only loses its own hits and forces a re-list.
+        """
+        try:
+            where = build_where(filters)
+            partitions = self._partitions_for(filters)
+            if not partitions:
+                return []
+            query_embeddings = self._embed_query_text(query_text)
+            results_by_name = self._partition_fanout.run(
+                [(name, self._query_partition, (name, query_text, n_results, where, query_embeddings)) for name in partitions],
+                default=False
+            )
+            
+            hits = []
+            for name, results in results_by_name.items():
+                if results is False:
+                    # Failed or timed out; drop the cached collection and re-list next time
+                    with self._partition_lock:
+                        self._partitions.pop(name, None)
+                        self._partitions_listed_at = 0.0
+                    continue
+                if not results or not results.get("metadatas"):
+                    continue
+                hits.extend(zip(results["distances"][0], results["metadatas"][0]))
+            
+            hits.sort(key=lambda hit: hit[0])
+            logger.info(f"Queried {len(partitions)} partitions, {len(hits)} candidate hits")
+            return [strip_index_fields(metadata) for _, metadata in hits[:n_results]]
+        except Exception as e:
+            logger.error(f"Error querying vector store partitions: {e}")
+            logger.error(f"Query: {query_text}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return []